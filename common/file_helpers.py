@@ -1,3 +1,4 @@
+import bz2
 import os
 import tempfile
 import contextlib
@@ -35,3 +36,48 @@ def atomic_write_in_dir(path: str, mode: str = 'w', buffering: int = -1, encodin
     yield tmp_file
     tmp_file_name = tmp_file.name
   os.replace(tmp_file_name, path)
+
+
+class Bz2CompressingReader:
+  """Wraps a file, but returns its bz2 compressed contents from read.
+  The compressed size is computed upfront with a streaming pass and exposed as len,
+  so the reader can be used as a request body with a Content-Length in constant memory."""
+  def __init__(self, f, chunk_size: int = 1024 * 1024):
+    self.f = f
+    self.chunk_size = chunk_size
+    self.start = f.tell()
+
+    self.len = sum(len(chunk) for chunk in self._compressed_chunks())
+    self.f.seek(self.start)
+
+    self.chunks = self._compressed_chunks()
+    self.buf = bytearray()
+    self.pos = 0
+
+  def _compressed_chunks(self):
+    compressor = bz2.BZ2Compressor()
+    while chunk := self.f.read(self.chunk_size):
+      if out := compressor.compress(chunk):
+        yield out
+    yield compressor.flush()
+
+  def read(self, size: int = -1) -> bytes:
+    while size < 0 or len(self.buf) < size:
+      chunk = next(self.chunks, None)
+      if chunk is None:
+        break
+      self.buf += chunk
+
+    if size < 0 or size > len(self.buf):
+      size = len(self.buf)
+    out = bytes(self.buf[:size])
+    del self.buf[:size]
+    self.pos += len(out)
+    return out
+
+  def tell(self) -> int:
+    return self.pos
+
+  def __iter__(self):
+    while chunk := self.read(self.chunk_size):
+      yield chunk
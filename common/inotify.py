@@ -0,0 +1,112 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+from typing import NamedTuple
+
+# from <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = os.O_CLOEXEC
+
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+class InotifyEvent(NamedTuple):
+  path: str  # watched directory
+  name: str  # file name inside the watched directory, empty for events on the directory itself
+  mask: int
+
+
+def _load_libc():
+  try:
+    libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+  except OSError:
+    return None
+  if not all(hasattr(libc, f) for f in ("inotify_init1", "inotify_add_watch", "inotify_rm_watch")):
+    return None
+  return libc
+
+
+class Inotify:
+  """Minimal non-blocking inotify wrapper. Only available on Linux, check Inotify.available() first."""
+  _libc = _load_libc()
+
+  @classmethod
+  def available(cls) -> bool:
+    return cls._libc is not None
+
+  def __init__(self):
+    assert self.available(), "inotify is not available on this platform"
+    self.fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+    if self.fd < 0:
+      err = ctypes.get_errno()
+      raise OSError(err, os.strerror(err))
+    self.watches: dict[int, str] = {}
+
+  def close(self) -> None:
+    if self.fd >= 0:
+      os.close(self.fd)
+      self.fd = -1
+    self.watches.clear()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *args) -> None:
+    self.close()
+
+  def fileno(self) -> int:
+    return self.fd
+
+  def add_watch(self, path: str, mask: int) -> int:
+    wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+    if wd < 0:
+      err = ctypes.get_errno()
+      raise OSError(err, os.strerror(err), path)
+    self.watches[wd] = path
+    return wd
+
+  def rm_watch(self, path: str) -> None:
+    for wd, p in list(self.watches.items()):
+      if p == path:
+        del self.watches[wd]
+        self._libc.inotify_rm_watch(self.fd, wd)
+
+  def read(self, timeout: float = 0.) -> list[InotifyEvent]:
+    """Returns all pending events, waiting up to timeout seconds for the first one"""
+    if timeout > 0:
+      r, _, _ = select.select([self.fd], [], [], timeout)
+      if not r:
+        return []
+
+    events = []
+    while True:
+      try:
+        buf = os.read(self.fd, 64 * 1024)
+      except BlockingIOError:
+        break
+
+      offset = 0
+      while offset < len(buf):
+        wd, mask, _, name_len = _EVENT_HEADER.unpack_from(buf, offset)
+        offset += _EVENT_HEADER.size
+        name = buf[offset:offset + name_len].rstrip(b"\0").decode(errors="replace")
+        offset += name_len
+
+        path = self.watches.get(wd, "")
+        if mask & IN_IGNORED:
+          self.watches.pop(wd, None)
+        events.append(InotifyEvent(path, name, mask))
+    return events
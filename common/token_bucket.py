@@ -0,0 +1,40 @@
+import threading
+import time
+from collections.abc import Callable
+
+from openpilot.common.file_helpers import CallbackReader
+
+
+class TokenBucket:
+  """Rate limit shared between threads, in units (e.g. bytes) per second. A rate of 0 is unlimited."""
+  def __init__(self, rate: float = 0.):
+    self.lock = threading.Lock()
+    self.rate = rate
+    self.tokens = rate
+    self.last_refill = time.monotonic()
+
+  def set_rate(self, rate: float) -> None:
+    with self.lock:
+      if rate != self.rate:
+        self.rate = rate
+        self.tokens = min(self.tokens, rate)
+
+  def consume(self, n: int, sleep: Callable[[float], object] = time.sleep) -> None:
+    with self.lock:
+      if self.rate <= 0:
+        return
+      now = time.monotonic()
+      # allow bursts of up to one second worth of data
+      self.tokens = min(self.rate, self.tokens + (now - self.last_refill) * self.rate) - n
+      self.last_refill = now
+      delay = -self.tokens / self.rate
+    if delay > 0:
+      sleep(delay)
+
+  def wrap(self, f):
+    sent = 0
+    def callback(total_read: int) -> None:
+      nonlocal sent
+      self.consume(total_read - sent)
+      sent = total_read
+    return CallbackReader(f, callback)
@@ -1,2 +1,8 @@
 from opendbc.can.packer_pyx import CANPacker # pylint: disable=no-name-in-module, import-error
 assert CANPacker
+
+try:
+  from opendbc.can.packer_pyx import CANMessageTemplate # pylint: disable=no-name-in-module, import-error
+except ImportError:
+  # prebuilt packer_pyx from before message templates, CANPacker.get_template isn't available
+  CANMessageTemplate = None
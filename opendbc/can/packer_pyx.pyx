@@ -7,6 +7,7 @@ from libcpp.vector cimport vector
 from .common cimport CANPacker as cpp_CANPacker
 from .common cimport dbc_lookup, SignalPackValue, DBC, Msg
 
+cdef class CANMessageTemplate
 
 cdef class CANPacker:
   cdef:
@@ -36,18 +37,76 @@ cdef class CANPacker:
 
     return self.packer.pack(addr, values_thing)
 
-  cpdef make_can_msg(self, name_or_addr, bus, values):
-    cdef uint32_t addr = 0
+  cdef uint32_t lookup_address(self, name_or_addr):
     cdef const Msg* m
     if isinstance(name_or_addr, int):
-      addr = name_or_addr
-    else:
-      try:
-        m = self.dbc.name_to_msg.at(name_or_addr.encode("utf8"))
-        addr = m.address
-      except IndexError:
-        # The C++ pack function will log an error message for invalid addresses
-        pass
+      return name_or_addr
+    try:
+      m = self.dbc.name_to_msg.at(name_or_addr.encode("utf8"))
+      return m.address
+    except IndexError:
+      # The C++ pack function will log an error message for invalid addresses
+      return 0
 
+  cpdef make_can_msg(self, name_or_addr, bus, values):
+    cdef uint32_t addr = self.lookup_address(name_or_addr)
     cdef vector[uint8_t] val = self.pack(addr, values)
     return [addr, 0, (<char *>&val[0])[:val.size()], bus]
+
+  def get_template(self, name_or_addr, signal_names):
+    """Returns a CANMessageTemplate packing signal_names, in this order, into the message"""
+    return CANMessageTemplate(self, name_or_addr, signal_names)
+
+  def make_can_msgs(self, msgs):
+    """Packs a frame's messages, given as (template, bus, values) tuples, in one call"""
+    cdef CANMessageTemplate template
+    ret = []
+    for template, bus, values in msgs:
+      ret.append(template.pack(bus, values))
+    return ret
+
+
+cdef class CANMessageTemplate:
+  """A message whose address and signal names are resolved once, packed from values in a fixed order"""
+  cdef:
+    CANPacker packer
+    vector[SignalPackValue] signals
+
+  cdef readonly:
+    uint32_t address
+    tuple signal_names
+
+  def __init__(self, CANPacker packer, name_or_addr, signal_names):
+    self.packer = packer
+    self.address = packer.lookup_address(name_or_addr)
+    self.signal_names = tuple(signal_names)
+
+    cdef const Msg* m
+    try:
+      m = packer.dbc.addr_to_msg.at(self.address)
+    except IndexError:
+      raise RuntimeError(f"could not find message {repr(name_or_addr)} in DBC")
+
+    cdef SignalPackValue spv
+    known_signals = {m.sigs[i].name for i in range(m.sigs.size())}
+    for name in self.signal_names:
+      encoded_name = name.encode("utf8")
+      if encoded_name not in known_signals:
+        raise RuntimeError(f"could not find signal {repr(name)} in message {repr(name_or_addr)}")
+      spv.name = encoded_name
+      spv.value = 0
+      self.signals.push_back(spv)
+
+  cdef list pack(self, bus, values):
+    if len(values) != self.signals.size():
+      raise ValueError(f"expected {self.signals.size()} values, got {len(values)}")
+
+    cdef size_t i
+    for i in range(self.signals.size()):
+      self.signals[i].value = values[i]
+
+    cdef vector[uint8_t] val = self.packer.packer.pack(self.address, self.signals)
+    return [self.address, 0, (<char *>&val[0])[:val.size()], bus]
+
+  def make_can_msg(self, bus, values):
+    return self.pack(bus, values)
@@ -4,14 +4,77 @@
 from cython.operator cimport dereference as deref, preincrement as preinc
 from libcpp.pair cimport pair
 from libcpp.string cimport string
+from libcpp.unordered_map cimport unordered_map
 from libcpp.vector cimport vector
-from libc.stdint cimport uint32_t
+from libc.stdint cimport uint32_t, uint64_t
 
 from .common cimport CANParser as cpp_CANParser
 from .common cimport dbc_lookup, SignalValue, DBC
 
 import numbers
+import sys
 from collections import defaultdict
+from collections.abc import Mapping
+
+import numpy as np
+
+cdef enum SignalField:
+  VALUE,
+  ALL_VALUES,
+  TS_NANOS
+
+
+cdef class CANParser
+
+
+cdef class SignalView:
+  """Read-only mapping from the signal names of one message to the parser's arrays.
+  Values are only converted to Python objects when read, copy.copy() returns a dict snapshot."""
+  cdef:
+    CANParser parser
+    dict ids
+    SignalField field
+
+  def __getitem__(self, name):
+    cdef int sid = self.ids[name]
+    if self.field == VALUE:
+      return self.parser.values_view[sid]
+    elif self.field == TS_NANOS:
+      return self.parser.ts_nanos_view[sid]
+    elif self.parser.updated_cycle_view[sid] == self.parser.cycle:
+      return self.parser.all_values[sid]
+    # like vl_all's defaultdict, signals without updates this cycle have no values
+    return []
+
+  def __contains__(self, name):
+    return name in self.ids
+
+  def __iter__(self):
+    return iter(self.ids)
+
+  def __len__(self):
+    return len(self.ids)
+
+  def get(self, name, default=None):
+    return self[name] if name in self.ids else default
+
+  def keys(self):
+    return self.ids.keys()
+
+  def values(self):
+    return [self[name] for name in self.ids]
+
+  def items(self):
+    return [(name, self[name]) for name in self.ids]
+
+  def __copy__(self):
+    return dict(self.items())
+
+  def __repr__(self):
+    return repr(dict(self.items()))
+
+
+Mapping.register(SignalView)
 
 
 cdef class CANParser:
@@ -21,21 +84,47 @@ cdef class CANParser:
     vector[SignalValue] can_values
     vector[uint32_t] addresses
 
+    # array output: address -> signal name -> signal id
+    unordered_map[uint32_t, unordered_map[string, int]] signal_id_lookup
+    vector[vector[double]] all_values
+    double[::1] values_view
+    uint64_t[::1] ts_nanos_view
+    uint64_t[::1] updated_cycle_view
+
   cdef readonly:
     dict vl
     dict vl_all
     dict ts_nanos
     string dbc_name
+    list messages
+    int bus
 
-  def __init__(self, dbc_name, messages, bus=0):
+    bint array_output
+    # array output: message name or address -> signal name -> signal id, indexing the arrays below
+    dict signal_ids
+    list signal_names
+    object signal_values
+    object signal_ts_nanos
+    object updated_cycle
+    uint64_t cycle
+
+  def __init__(self, dbc_name, messages, bus=0, array_output=False):
+    """With array_output, signals are written to the preallocated signal_values, signal_ts_nanos
+    and updated_cycle arrays instead of dicts, and vl, vl_all and ts_nanos are lazy views on them."""
     self.dbc_name = dbc_name
     self.dbc = dbc_lookup(dbc_name)
     if not self.dbc:
       raise RuntimeError(f"Can't find DBC: {dbc_name}")
 
+    self.messages = list(messages)
+    self.bus = bus
     self.vl = {}
     self.vl_all = {}
     self.ts_nanos = {}
+    self.array_output = array_output
+    self.signal_ids = {}
+    self.signal_names = []
+    self.cycle = 0
 
     # Convert message names into addresses and check existence in DBC
     cdef vector[pair[uint32_t, int]] message_v
@@ -51,21 +140,56 @@ cdef class CANParser:
       self.addresses.push_back(address)
 
       name = m.name.decode("utf8")
-      self.vl[address] = {}
+      if self.array_output:
+        ids = {}
+        for j in range(m.sigs.size()):
+          # names are interned once here, updates don't create any Python strings
+          sig_name = sys.intern(m.sigs[j].name.decode("utf8"))
+          ids[sig_name] = len(self.signal_names)
+          self.signal_id_lookup[address][m.sigs[j].name] = len(self.signal_names)
+          self.signal_names.append(sig_name)
+        self.signal_ids[address] = ids
+        self.signal_ids[name] = ids
+
+        self.vl[address] = self._view(ids, VALUE)
+        self.vl_all[address] = self._view(ids, ALL_VALUES)
+        self.ts_nanos[address] = self._view(ids, TS_NANOS)
+      else:
+        self.vl[address] = {}
+        self.vl_all[address] = defaultdict(list)
+        self.ts_nanos[address] = {}
       self.vl[name] = self.vl[address]
-      self.vl_all[address] = defaultdict(list)
       self.vl_all[name] = self.vl_all[address]
-      self.ts_nanos[address] = {}
       self.ts_nanos[name] = self.ts_nanos[address]
 
+    if self.array_output:
+      n = len(self.signal_names)
+      self.signal_values = np.zeros(n, dtype=np.float64)
+      self.signal_ts_nanos = np.zeros(n, dtype=np.uint64)
+      self.updated_cycle = np.zeros(n, dtype=np.uint64)
+      self.values_view = self.signal_values
+      self.ts_nanos_view = self.signal_ts_nanos
+      self.updated_cycle_view = self.updated_cycle
+      self.all_values.resize(n)
+
     self.can = new cpp_CANParser(bus, dbc_name, message_v)
     self.update_strings([])
 
+  cdef SignalView _view(self, dict ids, SignalField field):
+    cdef SignalView view = SignalView.__new__(SignalView)
+    view.parser = self
+    view.ids = ids
+    view.field = field
+    return view
+
   def __dealloc__(self):
     if self.can:
       del self.can
 
   def update_strings(self, strings, sendcan=False):
+    if self.array_output:
+      return self._update_arrays(strings, sendcan)
+
     for address in self.addresses:
       self.vl_all[address].clear()
 
@@ -99,6 +223,41 @@ cdef class CANParser:
 
     return updated_addrs
 
+  cdef set _update_arrays(self, strings, bint sendcan):
+    cdef vector[SignalValue] new_vals
+    cdef uint32_t cur_address = 0
+    cdef bint first = True
+    cdef unordered_map[string, int]* ids = NULL
+    cdef unordered_map[string, int].iterator id_it
+    cdef int sid
+    updated_addrs = set()
+
+    self.can.update_strings(strings, new_vals, sendcan)
+    self.cycle += 1
+
+    cdef vector[SignalValue].iterator it = new_vals.begin()
+    cdef SignalValue* cv
+    while it != new_vals.end():
+      cv = &deref(it)
+
+      # Check if the address has changed
+      if first or cv.address != cur_address:
+        first = False
+        cur_address = cv.address
+        ids = &self.signal_id_lookup[cur_address]
+        updated_addrs.add(cur_address)
+
+      id_it = ids.find(cv.name)
+      if id_it != ids.end():
+        sid = deref(id_it).second
+        self.values_view[sid] = cv.value
+        self.ts_nanos_view[sid] = cv.ts_nanos
+        self.updated_cycle_view[sid] = self.cycle
+        self.all_values[sid] = cv.all_values
+      preinc(it)
+
+    return updated_addrs
+
   @property
   def can_valid(self):
     return self.can.can_valid
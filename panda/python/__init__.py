@@ -29,6 +29,10 @@ LEN_TO_DLC = {length: dlc for (dlc, length) in enumerate(DLC_TO_LEN)}
 PANDA_BUS_CNT = 4
 
 
+CAN_HEADER = struct.Struct('<BI')  # data length code and bus, then address and flags
+CAN_CHUNK_SIZE = 256
+
+
 def calculate_checksum(data):
   res = 0
   for b in data:
@@ -36,58 +40,60 @@ def calculate_checksum(data):
   return res
 
 def pack_can_buffer(arr):
-  snds = [b'']
+  snds = []
+  chunk = []
+  chunk_len = 0
   for address, _, dat, bus in arr:
     assert len(dat) in LEN_TO_DLC
     #logging.debug("  W 0x%x: 0x%s", address, dat.hex())
 
     extended = 1 if address >= 0x800 else 0
     data_len_code = LEN_TO_DLC[len(dat)]
-    header = bytearray(CANPACKET_HEAD_SIZE)
-    word_4b = address << 3 | extended << 2
-    header[0] = (data_len_code << 4) | (bus << 1)
-    header[1] = word_4b & 0xFF
-    header[2] = (word_4b >> 8) & 0xFF
-    header[3] = (word_4b >> 16) & 0xFF
-    header[4] = (word_4b >> 24) & 0xFF
-    header[5] = calculate_checksum(header[:5] + dat)
-
-    snds[-1] += header + dat
-    if len(snds[-1]) > 256: # Limit chunks to 256 bytes
-      snds.append(b'')
-
+    header = CAN_HEADER.pack((data_len_code << 4) | (bus << 1), address << 3 | extended << 2)
+    checksum = calculate_checksum(header) ^ calculate_checksum(dat)
+
+    # parts are joined once per chunk instead of growing a bytes object per packet
+    chunk += (header, bytes((checksum,)), dat)
+    chunk_len += CANPACKET_HEAD_SIZE + len(dat)
+    if chunk_len > CAN_CHUNK_SIZE: # Limit chunks to 256 bytes
+      snds.append(b''.join(chunk))
+      chunk = []
+      chunk_len = 0
+
+  snds.append(b''.join(chunk))
   return snds
 
 def unpack_can_buffer(dat):
   ret = []
+  dat = bytes(dat)
+  offset = 0
 
-  while len(dat) >= CANPACKET_HEAD_SIZE:
-    data_len = DLC_TO_LEN[(dat[0]>>4)]
+  # walk the buffer by offset, slicing off the consumed part each packet is quadratic in its size
+  while len(dat) - offset >= CANPACKET_HEAD_SIZE:
+    end = offset + CANPACKET_HEAD_SIZE + DLC_TO_LEN[(dat[offset]>>4)]
+
+    # we need more from the next transfer
+    if end > len(dat):
+      break
 
-    header = dat[:CANPACKET_HEAD_SIZE]
+    packet = dat[offset:end]
+    assert calculate_checksum(packet) == 0, "CAN packet checksum incorrect"
 
-    bus = (header[0] >> 1) & 0x7
-    address = (header[4] << 24 | header[3] << 16 | header[2] << 8 | header[1]) >> 3
+    header_0, word_4b = CAN_HEADER.unpack_from(packet)
+    bus = (header_0 >> 1) & 0x7
+    address = word_4b >> 3
 
-    if (header[1] >> 1) & 0x1:
+    if (word_4b >> 1) & 0x1:
       # returned
       bus += 128
-    if header[1] & 0x1:
+    if word_4b & 0x1:
       # rejected
       bus += 192
 
-    # we need more from the next transfer
-    if data_len > len(dat) - CANPACKET_HEAD_SIZE:
-      break
-
-    assert calculate_checksum(dat[:(CANPACKET_HEAD_SIZE+data_len)]) == 0, "CAN packet checksum incorrect"
-
-    data = dat[CANPACKET_HEAD_SIZE:(CANPACKET_HEAD_SIZE+data_len)]
-    dat = dat[(CANPACKET_HEAD_SIZE+data_len):]
-
-    ret.append((address, 0, data, bus))
+    ret.append((address, 0, packet[CANPACKET_HEAD_SIZE:], bus))
+    offset = end
 
-  return (ret, dat)
+  return (ret, dat[offset:])
 
 
 def ensure_version(desc, lib_field, panda_field, fn):
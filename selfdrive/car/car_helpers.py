@@ -1,12 +1,13 @@
 import os
 import threading
 import time
-from collections.abc import Callable
+from collections.abc import Callable, Iterator, Mapping
+from functools import cache
 
 from cereal import car
 from openpilot.common.params import Params
 from openpilot.selfdrive.car.interfaces import get_interface_attr
-from openpilot.selfdrive.car.fingerprints import eliminate_incompatible_cars, all_legacy_fingerprint_cars
+from openpilot.selfdrive.car.fingerprints import ALL_LEGACY_CARS_MASK, cars_from_mask, get_compatible_cars_mask
 from openpilot.selfdrive.car.vin import get_vin, is_valid_vin, VIN_UNKNOWN
 from openpilot.selfdrive.car.fw_versions import get_fw_versions_ordered, get_present_ecus, match_fw_to_car, set_obd_multiplexing
 from openpilot.selfdrive.car.mock.values import CAR as MOCK
@@ -44,16 +45,13 @@ def get_one_can(logcan):
       return can
 
 
-def load_interfaces(brand_names):
-  ret = {}
-  for brand_name in brand_names:
-    path = f'openpilot.selfdrive.car.{brand_name}'
-    CarInterface = __import__(path + '.interface', fromlist=['CarInterface']).CarInterface
-    CarState = __import__(path + '.carstate', fromlist=['CarState']).CarState
-    CarController = __import__(path + '.carcontroller', fromlist=['CarController']).CarController
-    for model_name in brand_names[brand_name]:
-      ret[model_name] = (CarInterface, CarController, CarState)
-  return ret
+@cache
+def load_interface(brand_name: str) -> tuple[type, type, type]:
+  path = f'openpilot.selfdrive.car.{brand_name}'
+  CarInterface = __import__(path + '.interface', fromlist=['CarInterface']).CarInterface
+  CarState = __import__(path + '.carstate', fromlist=['CarState']).CarState
+  CarController = __import__(path + '.carcontroller', fromlist=['CarController']).CarController
+  return CarInterface, CarController, CarState
 
 
 def _get_interface_names() -> dict[str, list[str]]:
@@ -65,14 +63,42 @@ def _get_interface_names() -> dict[str, list[str]]:
   return brand_names
 
 
-# imports from directory selfdrive/car/<name>/
+class LazyInterfaces(Mapping):
+  """Car model -> (CarInterface, CarController, CarState). A brand's interface modules
+  are only imported once one of its models is looked up, card only ever needs one brand."""
+  def __init__(self, brand_names: dict[str, list[str]]):
+    self.model_to_brand = {model: brand for brand, models in brand_names.items() for model in models}
+
+  def __getitem__(self, car_model: str) -> tuple[type, type, type]:
+    return load_interface(self.model_to_brand[car_model])
+
+  def __contains__(self, car_model) -> bool:
+    return car_model in self.model_to_brand
+
+  def __iter__(self) -> Iterator[str]:
+    return iter(self.model_to_brand)
+
+  def __len__(self) -> int:
+    return len(self.model_to_brand)
+
+  def preload(self, car_model: str) -> None:
+    """Imports the interface of car_model in the background"""
+    if car_model in self.model_to_brand:
+      threading.Thread(target=load_interface, args=(self.model_to_brand[car_model],), daemon=True).start()
+
+
+# brand -> models, from selfdrive/car/<name>/values.py
 interface_names = _get_interface_names()
-interfaces = load_interfaces(interface_names)
+# imports from directory selfdrive/car/<name>/ on first use
+interfaces = LazyInterfaces(interface_names)
 
 
 def can_fingerprint(next_can: Callable) -> tuple[str | None, dict[int, dict]]:
   finger = gen_empty_fingerprint()
-  candidate_cars = {i: all_legacy_fingerprint_cars() for i in [0, 1]}  # attempt fingerprint on both bus 0 and 1
+  # bitmask of legacy fingerprint cars, attempt fingerprint on both bus 0 and 1
+  candidate_cars = {i: ALL_LEGACY_CARS_MASK for i in [0, 1]}
+  # (address, length) pairs already used to eliminate cars, seeing them again changes nothing
+  seen_messages: dict[int, set[tuple[int, int]]] = {b: set() for b in candidate_cars}
   frame = 0
   car_fingerprint = None
   done = False
@@ -80,28 +106,35 @@ def can_fingerprint(next_can: Callable) -> tuple[str | None, dict[int, dict]]:
   while not done:
     a = next_can()
 
+    messages: dict[int, set[tuple[int, int]]] = {b: set() for b in candidate_cars}
     for can in a.can:
+      length = len(can.dat)
       # The fingerprint dict is generated for all buses, this way the car interface
       # can use it to detect a (valid) multipanda setup and initialize accordingly
       if can.src < 128:
         if can.src not in finger:
           finger[can.src] = {}
-        finger[can.src][can.address] = len(can.dat)
+        finger[can.src][can.address] = length
+
+      # Ignore extended messages and VIN query response.
+      if can.src in messages and can.address < 0x800 and can.address not in (0x7df, 0x7e0, 0x7e8):
+        messages[can.src].add((can.address, length))
 
-      for b in candidate_cars:
-        # Ignore extended messages and VIN query response.
-        if can.src == b and can.address < 0x800 and can.address not in (0x7df, 0x7e0, 0x7e8):
-          candidate_cars[b] = eliminate_incompatible_cars(can, candidate_cars[b])
+    for b in candidate_cars:
+      new_messages = messages[b] - seen_messages[b]
+      if new_messages:
+        candidate_cars[b] &= get_compatible_cars_mask(new_messages)
+        seen_messages[b] |= new_messages
 
     # if we only have one car choice and the time since we got our first
     # message has elapsed, exit
     for b in candidate_cars:
-      if len(candidate_cars[b]) == 1 and frame > FRAME_FINGERPRINT:
+      if candidate_cars[b].bit_count() == 1 and frame > FRAME_FINGERPRINT:
         # fingerprint done
-        car_fingerprint = candidate_cars[b][0]
+        car_fingerprint = cars_from_mask(candidate_cars[b])[0]
 
     # bail if no cars left or we've been waiting for more than 2s
-    failed = (all(len(cc) == 0 for cc in candidate_cars.values()) and frame > FRAME_FINGERPRINT) or frame > 200
+    failed = (all(cc == 0 for cc in candidate_cars.values()) and frame > FRAME_FINGERPRINT) or frame > 200
     succeeded = car_fingerprint is not None
     done = failed or succeeded
 
@@ -161,6 +194,12 @@ def fingerprint(logcan, sendcan, num_pandas):
 
   fw_query_time = time.monotonic() - start_time
 
+  # the interface is likely going to be needed, import it while CAN fingerprinting
+  if fixed_fingerprint:
+    interfaces.preload(fixed_fingerprint)
+  elif len(fw_candidates) == 1:
+    interfaces.preload(list(fw_candidates)[0])
+
   # CAN fingerprint
   # drain CAN socket so we get the latest messages
   messaging.drain_sock_raw(logcan)
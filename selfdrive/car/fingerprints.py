@@ -1,3 +1,6 @@
+from collections import defaultdict
+from collections.abc import Iterable
+
 from openpilot.selfdrive.car.interfaces import get_interface_attr
 from openpilot.selfdrive.car.body.values import CAR as BODY
 from openpilot.selfdrive.car.chrysler.values import CAR as CHRYSLER
@@ -25,6 +28,40 @@ def is_valid_for_fingerprint(msg, car_fingerprint: dict[int, int]):
   return (adr in car_fingerprint and car_fingerprint[adr] == len(msg.dat)) or adr >= 0x800
 
 
+def _build_fingerprint_masks() -> dict[tuple[int, int], int]:
+  # (address, length) -> bitmask of the legacy fingerprint cars that can send it
+  masks: defaultdict[tuple[int, int], int] = defaultdict(int)
+  for i, car_name in enumerate(_LEGACY_CARS):
+    for fingerprint in _FINGERPRINTS[car_name]:
+      # add alien debug address
+      for address, length in (fingerprint | _DEBUG_ADDRESS).items():
+        masks[(address, length)] |= 1 << i
+  return dict(masks)
+
+
+_LEGACY_CARS = list(_FINGERPRINTS.keys())
+_LEGACY_CAR_BITS = {car_name: 1 << i for i, car_name in enumerate(_LEGACY_CARS)}
+_FINGERPRINT_MASKS = _build_fingerprint_masks()
+ALL_LEGACY_CARS_MASK = (1 << len(_LEGACY_CARS)) - 1
+# cars without any fingerprint can't send anything
+_FINGERPRINTED_CARS_MASK = sum(_LEGACY_CAR_BITS[car_name] for car_name in _LEGACY_CARS if len(_FINGERPRINTS[car_name]))
+
+
+def get_compatible_cars_mask(messages: Iterable[tuple[int, int]]) -> int:
+  """Returns the bitmask of legacy fingerprint cars that could have sent all (address, length) messages"""
+  mask = _FINGERPRINTED_CARS_MASK
+  for address, length in messages:
+    # ignore addresses that are more than 11 bits
+    if address < 0x800:
+      mask &= _FINGERPRINT_MASKS.get((address, length), 0)
+  return mask
+
+
+def cars_from_mask(mask: int) -> list[str]:
+  """Returns the legacy fingerprint cars in a bitmask"""
+  return [car_name for car_name, bit in _LEGACY_CAR_BITS.items() if mask & bit]
+
+
 def eliminate_incompatible_cars(msg, candidate_cars):
   """Removes cars that could not have sent msg.
 
@@ -35,18 +72,8 @@ def eliminate_incompatible_cars(msg, candidate_cars):
      Returns:
       A list containing the subset of candidate_cars that could have sent msg.
   """
-  compatible_cars = []
-
-  for car_name in candidate_cars:
-    car_fingerprints = _FINGERPRINTS[car_name]
-
-    for fingerprint in car_fingerprints:
-      # add alien debug address
-      if is_valid_for_fingerprint(msg, fingerprint | _DEBUG_ADDRESS):
-        compatible_cars.append(car_name)
-        break
-
-  return compatible_cars
+  mask = get_compatible_cars_mask([(msg.address, len(msg.dat))])
+  return [car_name for car_name in candidate_cars if mask & _LEGACY_CAR_BITS[car_name]]
 
 
 def all_known_cars():
@@ -1,7 +1,8 @@
 #!/usr/bin/env python3
 from collections import defaultdict
 from collections.abc import Iterator
-from typing import Any, Protocol, TypeVar
+from functools import cache
+from typing import Any, NamedTuple, Protocol, TypeVar
 
 from tqdm import tqdm
 import capnp
@@ -48,25 +49,24 @@ def build_fw_dict(fw_versions: list[capnp.lib.capnp._DynamicStructBuilder], filt
   return dict(fw_versions_dict)
 
 
-class MatchFwToCar(Protocol):
-  def __call__(self, live_fw_versions: LiveFwVersions, match_brand: str = None, log: bool = True) -> set[str]:
-    ...
-
+class ExactMatchIndex(NamedTuple):
+  candidates: frozenset[str]
+  # (candidate, ecu type) pairs with an ECU on each address
+  ecus: dict[AddrType, frozenset[tuple[str, Any]]]
+  # (candidate, ecu type) pairs accepting each FW version on each address
+  versions: dict[AddrType, dict[bytes, frozenset[tuple[str, Any]]]]
+  # candidates that don't match if nothing responds on each address
+  required: dict[AddrType, frozenset[str]]
 
-def match_fw_to_car_fuzzy(live_fw_versions: LiveFwVersions, match_brand: str = None, log: bool = True, exclude: str = None) -> set[str]:
-  """Do a fuzzy FW match. This function will return a match, and the number of firmware version
-  that were matched uniquely to that specific car. If multiple ECUs uniquely match to different cars
-  the match is rejected."""
 
-  # Build lookup table from (addr, sub_addr, fw) to list of candidate cars
+@cache
+def get_fuzzy_match_index(match_brand: str | None) -> dict[tuple[int, int | None, bytes], tuple[str, ...]]:
+  """Lookup table from (addr, sub_addr, fw) to candidate cars, built once per brand"""
   all_fw_versions = defaultdict(list)
   for candidate, fw_by_addr in FW_VERSIONS.items():
     if not is_brand(MODEL_TO_BRAND[candidate], match_brand):
       continue
 
-    if candidate == exclude:
-      continue
-
     for addr, fws in fw_by_addr.items():
       # These ECUs are known to be shared between models (EPS only between hybrid/ICE version)
       # Getting this exactly right isn't crucial, but excluding camera and radar makes it almost
@@ -76,6 +76,56 @@ def match_fw_to_car_fuzzy(live_fw_versions: LiveFwVersions, match_brand: str = N
         continue
       for f in fws:
         all_fw_versions[(addr[1], addr[2], f)].append(candidate)
+  return {k: tuple(v) for k, v in all_fw_versions.items()}
+
+
+@cache
+def get_exact_match_index(match_brand: str | None) -> ExactMatchIndex:
+  """Reverse lookup of FW_VERSIONS used for exact matching, built once per brand"""
+  candidates = set()
+  ecus: defaultdict[AddrType, set[tuple[str, Any]]] = defaultdict(set)
+  versions: defaultdict[AddrType, defaultdict[bytes, set[tuple[str, Any]]]] = defaultdict(lambda: defaultdict(set))
+  required: defaultdict[AddrType, set[str]] = defaultdict(set)
+
+  for candidate, fws in FW_VERSIONS.items():
+    if not is_brand(MODEL_TO_BRAND[candidate], match_brand):
+      continue
+
+    candidates.add(candidate)
+    config = FW_QUERY_CONFIGS[MODEL_TO_BRAND[candidate]]
+    for ecu, expected_versions in fws.items():
+      ecu_type = ecu[0]
+      addr = ecu[1:]
+
+      # Virtual debug ecu doesn't need to match the database
+      if ecu_type == Ecu.debug:
+        continue
+
+      ecus[addr].add((candidate, ecu_type))
+      for version in expected_versions:
+        versions[addr][version].add((candidate, ecu_type))
+
+      # Some models can sometimes miss an ecu, or show on two different addresses
+      # FIXME: this logic can be improved to be more specific, should require one of the two addresses
+      if ecu_type in ESSENTIAL_ECUS and candidate not in config.non_essential_ecus.get(ecu_type, []):
+        required[addr].add(candidate)
+
+  return ExactMatchIndex(frozenset(candidates), {addr: frozenset(e) for addr, e in ecus.items()},
+                         {addr: {v: frozenset(e) for v, e in vs.items()} for addr, vs in versions.items()},
+                         {addr: frozenset(required.get(addr, ())) for addr in ecus})
+
+
+class MatchFwToCar(Protocol):
+  def __call__(self, live_fw_versions: LiveFwVersions, match_brand: str = None, log: bool = True) -> set[str]:
+    ...
+
+
+def match_fw_to_car_fuzzy(live_fw_versions: LiveFwVersions, match_brand: str = None, log: bool = True, exclude: str = None) -> set[str]:
+  """Do a fuzzy FW match. This function will return a match, and the number of firmware version
+  that were matched uniquely to that specific car. If multiple ECUs uniquely match to different cars
+  the match is rejected."""
+
+  all_fw_versions = get_fuzzy_match_index(match_brand)
 
   matched_ecus = set()
   match: str | None = None
@@ -83,7 +133,9 @@ def match_fw_to_car_fuzzy(live_fw_versions: LiveFwVersions, match_brand: str = N
     ecu_key = (addr[0], addr[1])
     for version in versions:
       # All cars that have this FW response on the specified address
-      candidates = all_fw_versions[(*ecu_key, version)]
+      candidates = all_fw_versions.get((*ecu_key, version), ())
+      if exclude is not None:
+        candidates = tuple(c for c in candidates if c != exclude)
 
       if len(candidates) == 1:
         matched_ecus.add(ecu_key)
@@ -111,37 +163,22 @@ def match_fw_to_car_exact(live_fw_versions: LiveFwVersions, match_brand: str = N
   if extra_fw_versions is None:
     extra_fw_versions = {}
 
+  index = get_exact_match_index(match_brand)
   invalid = set()
-  candidates = {c: f for c, f in FW_VERSIONS.items() if
-                is_brand(MODEL_TO_BRAND[c], match_brand)}
-
-  for candidate, fws in candidates.items():
-    config = FW_QUERY_CONFIGS[MODEL_TO_BRAND[candidate]]
-    for ecu, expected_versions in fws.items():
-      expected_versions = expected_versions + extra_fw_versions.get(candidate, {}).get(ecu, [])
-      ecu_type = ecu[0]
-      addr = ecu[1:]
-
-      found_versions = live_fw_versions.get(addr, set())
-      if not len(found_versions):
-        # Some models can sometimes miss an ecu, or show on two different addresses
-        # FIXME: this logic can be improved to be more specific, should require one of the two addresses
-        if candidate in config.non_essential_ecus.get(ecu_type, []):
-          continue
-
-        # Ignore non essential ecus
-        if ecu_type not in ESSENTIAL_ECUS:
-          continue
-
-      # Virtual debug ecu doesn't need to match the database
-      if ecu_type == Ecu.debug:
-        continue
+  for addr, ecus in index.ecus.items():
+    found_versions = live_fw_versions.get(addr, set())
+    if not len(found_versions):
+      # Non essential ecus can be missing
+      invalid |= index.required[addr]
+      continue
 
-      if not any(found_version in expected_versions for found_version in found_versions):
+    addr_versions = index.versions[addr]
+    mismatched = ecus.difference(*(addr_versions.get(v, ()) for v in found_versions))
+    for candidate, ecu_type in mismatched:
+      if not any(v in found_versions for v in extra_fw_versions.get(candidate, {}).get((ecu_type, *addr), [])):
         invalid.add(candidate)
-        break
 
-  return set(candidates.keys()) - invalid
+  return set(index.candidates) - invalid
 
 
 def match_fw_to_car(fw_versions: list[capnp.lib.capnp._DynamicStructBuilder], vin: str,
@@ -18,6 +18,7 @@ from openpilot.common.params import Params
 from openpilot.common.realtime import DT_CTRL
 from openpilot.selfdrive.car import apply_hysteresis, gen_empty_fingerprint, scale_rot_inertia, scale_tire_stiffness, STD_CARGO_KG
 from openpilot.selfdrive.car.values import PLATFORMS
+from openpilot.selfdrive.car.torque_data.build_lat_models import build_store_arrays
 from openpilot.selfdrive.controls.lib.drive_helpers import CRUISE_LONG_PRESS, V_CRUISE_MAX, get_friction
 from openpilot.selfdrive.controls.lib.events import Events
 from openpilot.selfdrive.controls.lib.vehicle_model import VehicleModel
@@ -35,12 +36,13 @@ FRICTION_THRESHOLD = 0.3
 
 NEURAL_PARAMS_PATH = os.path.join(BASEDIR, 'selfdrive/car/torque_data/neural_ff_weights.json')
 TORQUE_NN_MODEL_PATH = os.path.join(BASEDIR, 'selfdrive/car/torque_data/lat_models')
+TORQUE_NN_MODEL_STORE = os.path.join(BASEDIR, 'selfdrive/car/torque_data/lat_models.npz')
 TORQUE_PARAMS_PATH = os.path.join(BASEDIR, 'selfdrive/car/torque_data/params.toml')
 TORQUE_OVERRIDE_PATH = os.path.join(BASEDIR, 'selfdrive/car/torque_data/override.toml')
 TORQUE_SUBSTITUTE_PATH = os.path.join(BASEDIR, 'selfdrive/car/torque_data/substitute.toml')
 
-# dict used to rename activation functions whose names aren't valid python identifiers
-ACTIVATION_FUNCTION_NAMES = {'σ': 'sigmoid'}
+# lowest similarity between a car and a model name to use the model
+NN_MODEL_MIN_SIMILARITY = 0.9
 
 GEAR_SHIFTER_MAP: dict[str, car.CarState.GearShifter] = {
   'P': GearShifter.park, 'PARK': GearShifter.park,
@@ -97,36 +99,65 @@ def get_torque_params():
   return torque_params
 
 # Twilsonco's Lateral Neural Network Feedforward
+class NNModelStore(NamedTuple):
+  index: dict[str, int]  # model name -> model number
+  weights: np.ndarray
+  layouts: np.ndarray  # (offset, rows, cols) of input_mean, input_std and the W and b of each layer, per model
+  activations: np.ndarray
+
+  def get_array(self, model, idx):
+    offset, rows, cols = self.layouts[model, idx]
+    return self.weights[offset:offset + rows * cols].reshape(rows, cols)
+
+@cache
+def get_nn_model_store() -> NNModelStore:
+  # built from TORQUE_NN_MODEL_PATH by torque_data/build_lat_models.py during the scons build,
+  # prebuilt trees don't run it so the store is built from the json models instead
+  if os.path.isfile(TORQUE_NN_MODEL_STORE):
+    with np.load(TORQUE_NN_MODEL_STORE) as f:
+      store = dict(f)
+  else:
+    store = build_store_arrays(TORQUE_NN_MODEL_PATH)
+
+  weights = store['weights']
+  weights.flags.writeable = False
+  return NNModelStore({str(name): i for i, name in enumerate(store['names'])}, weights, store['layouts'], store['activations'])
+
 class FluxModel:
-  def __init__(self, params_file, zero_bias=False):
-    with open(params_file, "r") as f:
-      params = json.load(f)
-
-    self.input_size = params["input_size"]
-    self.output_size = params["output_size"]
-    self.input_mean = np.array(params["input_mean"], dtype=np.float32).T
-    self.input_std = np.array(params["input_std"], dtype=np.float32).T
+  def __init__(self, model_name, zero_bias=False):
+    store = get_nn_model_store()
+    model = store.index[model_name]
+
+    # views of the store's weights
+    self.input_mean = store.get_array(model, 0)
+    self.input_std = store.get_array(model, 1)
+    self.input_size = self.input_mean.shape[1]
     self.layers = []
     self.friction_override = False
-
-    for layer_params in params["layers"]:
-      W = np.array(layer_params[next(key for key in layer_params.keys() if key.endswith('_W'))], dtype=np.float32).T
-      b = np.array(layer_params[next(key for key in layer_params.keys() if key.endswith('_b'))], dtype=np.float32).T
+    # batch size -> preallocated input and layer activations
+    self.activations: dict[int, list[np.ndarray]] = {}
+
+    for i, activation in enumerate(store.activations[model]):
+      if not activation:
+        break
+      W = store.get_array(model, 2 + 2 * i)
+      b = store.get_array(model, 3 + 2 * i)
       if zero_bias:
         b = np.zeros_like(b)
-      activation = layer_params["activation"]
-      for k, v in ACTIVATION_FUNCTION_NAMES.items():
-        activation = activation.replace(k, v)
-      self.layers.append((W, b, activation))
+      self.layers.append((W, b, str(activation)))
+    self.output_size = self.layers[-1][0].shape[1]
 
     self.validate_layers()
     self.check_for_friction_override()
 
   # Begin activation functions.
-  # These are called by name using the keys in the model json file
+  # These are called by name using the keys in the model json file, x is modified in place
   @staticmethod
   def sigmoid(x):
-    return 1 / (1 + np.exp(-x))
+    np.negative(x, out=x)
+    np.exp(x, out=x)
+    x += 1
+    return np.reciprocal(x, out=x)
 
   @staticmethod
   def identity(x):
@@ -138,24 +169,40 @@ class FluxModel:
       x = getattr(self, activation)(x.dot(W) + b)
     return x
 
-  def evaluate(self, input_array):
-    in_len = len(input_array)
-    if in_len != self.input_size:
+  def get_activations(self, batch_size):
+    activations = self.activations.get(batch_size)
+    if activations is None:
+      activations = [np.zeros((batch_size, self.input_size), dtype=np.float32)]
+      activations += [np.zeros((batch_size, W.shape[1]), dtype=np.float32) for W, _, _ in self.layers]
+      self.activations[batch_size] = activations
+    return activations
+
+  def evaluate_batch(self, input_arrays):
+    """Evaluates one input per row in a single pass through the layers, returns the first output of each"""
+    activations = self.get_activations(len(input_arrays))
+
+    x = activations[0]
+    x.fill(0.)
+    for i, input_array in enumerate(input_arrays):
       # If the input is length 2-4, then it's a simplified evaluation.
-      # In that case, need to add on zeros to fill out the input array to match the correct length.
-      if 2 <= in_len:
-        input_array = input_array + [0] * (self.input_size - in_len)
-      else:
-        raise ValueError(f"Input array length {len(input_array)} must be length 2 or greater")
+      # In that case, the rest of the row is left as zeros to match the correct length.
+      if not 2 <= len(input_array) <= self.input_size:
+        raise ValueError(f"Input array length {len(input_array)} must be between 2 and {self.input_size}")
+      x[i, :len(input_array)] = input_array
 
-    input_array = np.array(input_array, dtype=np.float32)
+    # Rescale the inputs using the input_mean and input_std
+    x -= self.input_mean
+    x /= self.input_std
 
-    # Rescale the input array using the input_mean and input_std
-    input_array = (input_array - self.input_mean) / self.input_std
+    for (W, b, activation), out in zip(self.layers, activations[1:], strict=True):
+      np.dot(x, W, out=out)
+      out += b
+      x = getattr(self, activation)(out)
 
-    output_array = self.forward(input_array)
+    return x[:, 0].tolist()
 
-    return float(output_array[0, 0])
+  def evaluate(self, input_array):
+    return self.evaluate_batch([input_array])[0]
 
   def validate_layers(self):
     for W, b, activation in self.layers:
@@ -166,34 +213,41 @@ class FluxModel:
     y = self.evaluate([10.0, 0.0, 0.2])
     self.friction_override = (y < 0.1)
 
-def get_nn_model_path(car, eps_firmware) -> tuple[str | None, float]:
-  def check_nn_path(check_model):
-    model_path = None
+def get_nn_model_name(car, eps_firmware) -> str | None:
+  model_index = get_nn_model_store().index
+
+  def check_nn_name(check_model):
+    # an exact match is the most similar model
+    if check_model in model_index:
+      return check_model, 1.0
+
+    model_name = None
     max_similarity = -1.0
-    for f in os.listdir(TORQUE_NN_MODEL_PATH):
-      if f.endswith(".json"):
-        model = f.replace(".json", "").replace(f"{TORQUE_NN_MODEL_PATH}/", "")
-        similarity_score = similarity(model, check_model)
-        if similarity_score > max_similarity:
-          max_similarity = similarity_score
-          model_path = os.path.join(TORQUE_NN_MODEL_PATH, f)
-    return model_path, max_similarity
+    for model in model_index:
+      # similarity is at most 2 * min(len) / (sum of lens), skip models that can't be similar enough to be used
+      if 2 * min(len(model), len(check_model)) < NN_MODEL_MIN_SIMILARITY * (len(model) + len(check_model)):
+        continue
+      similarity_score = similarity(model, check_model)
+      if similarity_score > max_similarity:
+        max_similarity = similarity_score
+        model_name = model
+    return model_name, max_similarity
 
   if len(eps_firmware) > 3:
     eps_firmware = eps_firmware.replace("\\", "")
     check_model = f"{car} {eps_firmware}"
   else:
     check_model = car
-  model_path, max_similarity = check_nn_path(check_model)
-  if car not in model_path or 0.0 <= max_similarity < 0.9:
+  model_name, max_similarity = check_nn_name(check_model)
+  if model_name is None or car not in model_name or max_similarity < NN_MODEL_MIN_SIMILARITY:
     check_model = car
-    model_path, max_similarity = check_nn_path(check_model)
-    if car not in model_path or 0.0 <= max_similarity < 0.9:
-      model_path = None
-  return model_path
+    model_name, max_similarity = check_nn_name(check_model)
+    if model_name is None or car not in model_name or max_similarity < NN_MODEL_MIN_SIMILARITY:
+      model_name = None
+  return model_name
 
-def get_nn_model(car, eps_firmware) -> tuple[FluxModel | None, float]:
-  model = get_nn_model_path(car, eps_firmware)
+def get_nn_model(car, eps_firmware) -> FluxModel | None:
+  model = get_nn_model_name(car, eps_firmware)
   if model is not None:
     model = FluxModel(model)
   return model
@@ -251,6 +305,9 @@ class CarInterfaceBase(ABC):
   def get_ff_nn(self, x):
     return self.lat_torque_nn_model.evaluate(x)
 
+  def get_ff_nn_batch(self, xs):
+    return self.lat_torque_nn_model.evaluate_batch(xs)
+
   def check_comma_nn_ff_support(self, car):
     with open(NEURAL_PARAMS_PATH, 'r') as file:
       data = json.load(file)
@@ -297,7 +354,7 @@ class CarInterfaceBase(ABC):
     if ret.steerControlType != car.CarParams.SteerControlType.angle and params.get_bool("LateralTune") and params.get_bool("NNFF"):
       CarInterfaceBase.configure_torque_tune(candidate, ret.lateralTuning)
       eps_firmware = str(next((fw.fwVersion for fw in car_fw if fw.ecu == "eps"), ""))
-      model = get_nn_model_path(candidate, eps_firmware)
+      model = get_nn_model_name(candidate, eps_firmware)
       if model is not None:
         params.put_nonblocking("NNFFModelName", candidate.replace("_", " "))
 
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+import json
+import os
+import sys
+
+import numpy as np
+
+# dict used to rename activation functions whose names aren't valid python identifiers
+ACTIVATION_FUNCTION_NAMES = {'σ': 'sigmoid'}
+
+
+def load_json_model(params_file: str) -> tuple[list[np.ndarray], list[str]]:
+  """Returns the input_mean, input_std and the W and b of every layer, and the layer activation functions"""
+  with open(params_file) as f:
+    params = json.load(f)
+
+  arrays = [np.array(params["input_mean"], dtype=np.float32).T, np.array(params["input_std"], dtype=np.float32).T]
+  activations = []
+  for layer_params in params["layers"]:
+    arrays.append(np.array(layer_params[next(key for key in layer_params.keys() if key.endswith('_W'))], dtype=np.float32).T)
+    arrays.append(np.array(layer_params[next(key for key in layer_params.keys() if key.endswith('_b'))], dtype=np.float32).T)
+    activation = layer_params["activation"]
+    for k, v in ACTIVATION_FUNCTION_NAMES.items():
+      activation = activation.replace(k, v)
+    activations.append(activation)
+  return arrays, activations
+
+
+def build_store_arrays(model_dir: str) -> dict[str, np.ndarray]:
+  names = sorted(f.removesuffix('.json') for f in os.listdir(model_dir) if f.endswith('.json'))
+  models = [load_json_model(os.path.join(model_dir, f'{name}.json')) for name in names]
+  max_layers = max(len(activations) for _, activations in models)
+
+  # all weights are stored in one flat array, for every model and array in load_json_model there is
+  # an (offset, rows, cols) entry in 'layouts', unused entries of models with fewer layers are zero
+  weights = []
+  layouts = np.zeros((len(names), 2 + 2 * max_layers, 3), dtype=np.int64)
+  activations = np.zeros((len(names), max_layers), dtype=f'U{max(len(a) for _, acts in models for a in acts)}')
+  offset = 0
+  for i, (model_arrays, model_activations) in enumerate(models):
+    for j, array in enumerate(model_arrays):
+      layouts[i, j] = (offset, *array.shape)
+      weights.append(array.ravel())
+      offset += array.size
+    activations[i, :len(model_activations)] = model_activations
+
+  return {'names': np.array(names), 'weights': np.concatenate(weights), 'layouts': layouts, 'activations': activations}
+
+
+def build_store(model_dir: str, store_path: str) -> None:
+  # uncompressed so loading is a single read without parsing or decompressing
+  with open(store_path, 'wb') as f:
+    np.savez(f, **build_store_arrays(model_dir))
+
+
+if __name__ == "__main__":
+  model_dir, store_path = sys.argv[1:3]
+  build_store(model_dir, store_path)
+  print(f'saved {model_dir} to {store_path}')
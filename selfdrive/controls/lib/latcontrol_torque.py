@@ -101,7 +101,7 @@ class LatControlTorque(LatControl):
       # NN model takes current v_ego, lateral_accel, lat accel/jerk error, roll, and past/future/planned data
       # of lat accel and roll
       # Past value is computed using previous desired lat accel and observed roll
-      self.torque_from_nn = CI.get_ff_nn
+      self.torques_from_nn = CI.get_ff_nn_batch
       self.nn_friction_override = CI.lat_torque_nn_model.friction_override
 
       # setup future time offsets
@@ -201,16 +201,7 @@ class LatControlTorque(LatControl):
         nnff_measurement_input = [CS.vEgo, measurement, lateral_jerk_measurement, roll] \
                                  + [measurement] * self.past_future_len \
                                  + past_rolls + future_rolls
-        torque_from_setpoint = self.torque_from_nn(nnff_setpoint_input)
-        torque_from_measurement = self.torque_from_nn(nnff_measurement_input)
-
-        pid_log.error = torque_from_setpoint - torque_from_measurement
-        error_blend_factor = interp(abs(desired_lateral_accel), [1.0, 2.0], [0.0, 1.0])
-        if error_blend_factor > 0.0:  # blend in stronger error response when in high lat accel
-          nnff_error_input = [CS.vEgo, setpoint - measurement, lateral_jerk_setpoint - lateral_jerk_measurement, 0.0]
-          torque_from_error = self.torque_from_nn(nnff_error_input)
-          if sign(pid_log.error) == sign(torque_from_error) and abs(pid_log.error) < abs(torque_from_error):
-            pid_log.error = pid_log.error * (1.0 - error_blend_factor) + torque_from_error * error_blend_factor
+        nnff_error_input = [CS.vEgo, setpoint - measurement, lateral_jerk_setpoint - lateral_jerk_measurement, 0.0]
 
         # compute feedforward (same as nn setpoint output)
         error = setpoint - measurement
@@ -218,7 +209,16 @@ class LatControlTorque(LatControl):
         nn_input = [CS.vEgo, desired_lateral_accel, friction_input, roll] \
                    + past_lateral_accels_desired + future_planned_lateral_accels \
                    + past_rolls + future_rolls
-        ff = self.torque_from_nn(nn_input)
+
+        # evaluate all inputs in one pass, the error response is cheap enough to always include
+        torque_from_setpoint, torque_from_measurement, torque_from_error, ff = \
+          self.torques_from_nn([nnff_setpoint_input, nnff_measurement_input, nnff_error_input, nn_input])
+
+        pid_log.error = torque_from_setpoint - torque_from_measurement
+        error_blend_factor = interp(abs(desired_lateral_accel), [1.0, 2.0], [0.0, 1.0])
+        if error_blend_factor > 0.0:  # blend in stronger error response when in high lat accel
+          if sign(pid_log.error) == sign(torque_from_error) and abs(pid_log.error) < abs(torque_from_error):
+            pid_log.error = pid_log.error * (1.0 - error_blend_factor) + torque_from_error * error_blend_factor
 
         # apply friction override for cars with low NN friction response
         if self.nn_friction_override:
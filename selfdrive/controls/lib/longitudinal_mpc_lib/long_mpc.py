@@ -251,6 +251,11 @@ class LongitudinalMpc:
     self.mode = mode
     self.dt = dt
     self.solver = AcadosOcpSolverCython(MODEL_NAME, ACADOS_SOLVER_TYPE, N)
+    # prebuilt solver wrappers from before set_all_stages/get_all_stages are used one stage at a time
+    self.bulk_stage_io = hasattr(self.solver, 'set_all_stages')
+    # weights last written to the solver, they are only rewritten when changed
+    self.cost_weights = None
+    self.constraint_cost_weights = None
     self.reset()
     self.source = SOURCES[2]
 
@@ -263,14 +268,12 @@ class LongitudinalMpc:
     self.prev_a = np.array(self.a_solution)
     self.j_solution = np.zeros(N)
     self.yref = np.zeros((N+1, COST_DIM))
-    for i in range(N):
-      self.solver.cost_set(i, "yref", self.yref[i])
-    self.solver.cost_set(N, "yref", self.yref[N][:COST_E_DIM])
+    # the terminal stage takes the first COST_E_DIM entries of its row
+    self.set_all_stages("yref", self.yref)
     self.x_sol = np.zeros((N+1, X_DIM))
     self.u_sol = np.zeros((N,1))
     self.params = np.zeros((N+1, PARAM_DIM))
-    for i in range(N+1):
-      self.solver.set(i, 'x', np.zeros(X_DIM))
+    self.set_all_stages('x', self.x_sol)
     self.last_cloudlog_t = 0
     self.status = False
     self.crash_cnt = 0.0
@@ -283,21 +286,42 @@ class LongitudinalMpc:
     self.x0 = np.zeros(X_DIM)
     self.set_weights()
 
-  def set_cost_weights(self, cost_weights, constraint_cost_weights):
-    W = np.asfortranarray(np.diag(cost_weights))
+  def set_all_stages(self, field, values):
+    if self.bulk_stage_io:
+      self.solver.set_all_stages(field, values)
+      return
+
     for i in range(N):
-      # TODO don't hardcode A_CHANGE_COST idx
-      # reduce the cost on (a-a_prev) later in the horizon.
-      W[4,4] = cost_weights[4] * np.interp(T_IDXS[i], [0.0, 1.0, 2.0], [1.0, 1.0, 0.0])
-      self.solver.cost_set(i, 'W', W)
-    # Setting the slice without the copy make the array not contiguous,
-    # causing issues with the C interface.
-    self.solver.cost_set(N, 'W', np.copy(W[:COST_E_DIM, :COST_E_DIM]))
+      self.solver.set(i, field, values[i])
+    self.solver.set(N, field, values[N][:COST_E_DIM] if field == 'yref' else values[N])
+
+  def get_all_stages(self, field):
+    if self.bulk_stage_io:
+      return self.solver.get_all_stages(field)
+    return np.array([self.solver.get(i, field) for i in range(N if field == 'u' else N+1)])
+
+  def set_cost_weights(self, cost_weights, constraint_cost_weights):
+    # weights usually only change with the personality or toggles, skip rewriting every stage each cycle
+    cost_weights = tuple(cost_weights)
+    if cost_weights != self.cost_weights:
+      W = np.asfortranarray(np.diag(cost_weights))
+      for i in range(N):
+        # TODO don't hardcode A_CHANGE_COST idx
+        # reduce the cost on (a-a_prev) later in the horizon.
+        W[4,4] = cost_weights[4] * np.interp(T_IDXS[i], [0.0, 1.0, 2.0], [1.0, 1.0, 0.0])
+        self.solver.cost_set(i, 'W', W)
+      # Setting the slice without the copy make the array not contiguous,
+      # causing issues with the C interface.
+      self.solver.cost_set(N, 'W', np.copy(W[:COST_E_DIM, :COST_E_DIM]))
+      self.cost_weights = cost_weights
 
     # Set L2 slack cost on lower bound constraints
-    Zl = np.array(constraint_cost_weights)
-    for i in range(N):
-      self.solver.cost_set(i, 'Zl', Zl)
+    constraint_cost_weights = tuple(constraint_cost_weights)
+    if constraint_cost_weights != self.constraint_cost_weights:
+      Zl = np.array(constraint_cost_weights)
+      for i in range(N):
+        self.solver.cost_set(i, 'Zl', Zl)
+      self.constraint_cost_weights = constraint_cost_weights
 
   def set_weights(self, acceleration_jerk=1.0, danger_jerk = 1.0, speed_jerk=1.0, prev_accel_constraint=True, personality=log.LongitudinalPersonality.standard):
     if self.mode == 'acc':
@@ -317,8 +341,7 @@ class LongitudinalMpc:
     self.x0[1] = v
     self.x0[2] = a
     if abs(v_prev - v) > 2.:  # probably only helps if v < v_prev
-      for i in range(N+1):
-        self.solver.set(i, 'x', self.x0)
+      self.set_all_stages('x', np.tile(self.x0, (N+1, 1)))
 
   @staticmethod
   def extrapolate_lead(x_lead, v_lead, a_lead, a_lead_tau):
@@ -413,9 +436,7 @@ class LongitudinalMpc:
     self.yref[:,2] = v
     self.yref[:,3] = a
     self.yref[:,5] = j
-    for i in range(N):
-      self.solver.set(i, "yref", self.yref[i])
-    self.solver.set(N, "yref", self.yref[N][:COST_E_DIM])
+    self.set_all_stages("yref", self.yref)
 
     self.params[:,2] = np.min(x_obstacles, axis=1)
     self.params[:,3] = np.copy(self.prev_a)
@@ -440,8 +461,7 @@ class LongitudinalMpc:
   def run(self):
     # t0 = time.monotonic()
     # reset = 0
-    for i in range(N+1):
-      self.solver.set(i, 'p', self.params[i])
+    self.set_all_stages('p', self.params)
     self.solver.constraints_set(0, "lbx", self.x0)
     self.solver.constraints_set(0, "ubx", self.x0)
 
@@ -458,10 +478,8 @@ class LongitudinalMpc:
     # print(f"long_mpc residuals: {res[0]:.2e}, {res[1]:.2e}, {res[2]:.2e}, {res[3]:.2e}")
     # self.solver.print_statistics()
 
-    for i in range(N+1):
-      self.x_sol[i] = self.solver.get(i, 'x')
-    for i in range(N):
-      self.u_sol[i] = self.solver.get(i, 'u')
+    self.x_sol[:] = self.get_all_stages('x')
+    self.u_sol[:] = self.get_all_stages('u')
 
     self.v_solution = self.x_sol[:,1]
     self.a_solution = self.x_sol[:,2]
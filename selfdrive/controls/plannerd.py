@@ -6,7 +6,8 @@ from openpilot.common.swaglog import cloudlog
 from openpilot.selfdrive.controls.lib.longitudinal_planner import LongitudinalPlanner
 import cereal.messaging as messaging
 
-from openpilot.selfdrive.frogpilot.controls.lib.frogpilot_variables import FrogPilotVariables
+from openpilot.selfdrive.frogpilot.controls.frogpilot_planner import FrogPilotPlanner
+from openpilot.selfdrive.frogpilot.controls.lib.frogpilot_variables import COLOCATED_PLANNERS, FrogPilotVariables
 
 def publish_ui_plan(sm, pm, longitudinal_planner):
   ui_send = messaging.new_message('uiPlan')
@@ -29,9 +30,16 @@ def plannerd_thread():
   cloudlog.info("plannerd got CarParams: %s", CP.carName)
 
   longitudinal_planner = LongitudinalPlanner(CP)
-  pm = messaging.PubMaster(['longitudinalPlan', 'uiPlan'])
-  sm = messaging.SubMaster(['carControl', 'carState', 'controlsState', 'radarState', 'modelV2', 'frogpilotCarControl', 'frogpilotCarState', 'frogpilotPlan'],
-                           poll='modelV2', ignore_avg_freq=['radarState'])
+  if COLOCATED_PLANNERS:
+    frogpilot_planner = FrogPilotPlanner()
+    pm = messaging.PubMaster(['longitudinalPlan', 'uiPlan', 'frogpilotPlan'])
+    sm = messaging.SubMaster(['carControl', 'carState', 'controlsState', 'radarState', 'modelV2', 'frogpilotCarControl', 'frogpilotCarState', 'frogpilotNavigation'],
+                             poll='modelV2', ignore_avg_freq=['radarState'])
+  else:
+    frogpilot_planner = None
+    pm = messaging.PubMaster(['longitudinalPlan', 'uiPlan'])
+    sm = messaging.SubMaster(['carControl', 'carState', 'controlsState', 'radarState', 'modelV2', 'frogpilotCarControl', 'frogpilotCarState', 'frogpilotPlan'],
+                             poll='modelV2', ignore_avg_freq=['radarState'])
 
   # FrogPilot variables
   frogpilot_toggles = FrogPilotVariables.toggles
@@ -41,7 +49,14 @@ def plannerd_thread():
   while True:
     sm.update()
     if sm.updated['modelV2']:
-      longitudinal_planner.update(sm, frogpilot_toggles)
+      if frogpilot_planner is not None:
+        frogpilot_planner.update(sm['carState'], sm['controlsState'], sm['frogpilotCarControl'], sm['frogpilotCarState'],
+                                 sm['frogpilotNavigation'], sm['modelV2'], sm['radarState'], frogpilot_toggles)
+        frogpilot_plan = frogpilot_planner.publish(sm, pm, frogpilot_toggles).frogpilotPlan
+      else:
+        frogpilot_plan = sm['frogpilotPlan']
+
+      longitudinal_planner.update(sm, frogpilot_plan, frogpilot_toggles)
       longitudinal_planner.publish(sm, pm)
       publish_ui_plan(sm, pm, longitudinal_planner)
 
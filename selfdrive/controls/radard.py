@@ -1,26 +1,21 @@
 #!/usr/bin/env python3
 import importlib
-import math
 from collections import deque
 from typing import Any
 
 import capnp
+import numpy as np
 from cereal import messaging, log, car
 from openpilot.common.numpy_fast import interp
 from openpilot.common.params import Params
 from openpilot.common.realtime import DT_CTRL, Ratekeeper, Priority, config_realtime_process
 from openpilot.common.swaglog import cloudlog
 
-from openpilot.common.simple_kalman import KF1D
-
 from openpilot.selfdrive.frogpilot.controls.lib.frogpilot_variables import FrogPilotVariables
 
 # Default lead acceleration decay set to 50% at 1s
 _LEAD_ACCEL_TAU = 1.5
 
-# radar tracks
-SPEED, ACCEL = 0, 1     # Kalman filter states enum
-
 # stationary qualification parameters
 V_EGO_STATIONARY = 4.   # no stationary object flag below this speed
 
@@ -50,101 +45,116 @@ class KalmanParams:
     self.K = [[interp(dt, dts, K0)], [interp(dt, dts, K1)]]
 
 
-class Track:
-  def __init__(self, identifier: int, v_lead: float, kalman_params: KalmanParams):
-    self.identifier = identifier
-    self.cnt = 0
-    self.aLeadTau = _LEAD_ACCEL_TAU
-    self.K_A = kalman_params.A
-    self.K_C = kalman_params.C
-    self.K_K = kalman_params.K
-    self.kf = KF1D([[v_lead], [0.0]], self.K_A, self.K_C, self.K_K)
+class Tracks:
+  """All radar tracks, stored as one array per field in the order the tracks were first seen.
+  Each track has a lead speed Kalman filter, they're all updated at once."""
+  def __init__(self, kalman_params: KalmanParams):
+    A, C, K = kalman_params.A, kalman_params.C, kalman_params.K
+    # the filter of KF1D: x = (A - K C) x + K meas
+    self.A_K = [[A[0][0] - K[0][0] * C[0], A[0][1] - K[0][0] * C[1]],
+                [A[1][0] - K[1][0] * C[0], A[1][1] - K[1][0] * C[1]]]
+    self.K = [K[0][0], K[1][0]]
+
+    self.identifiers = np.zeros(0, dtype=np.int64)
+    self.dRel = np.zeros(0)       # LONG_DIST
+    self.yRel = np.zeros(0)       # -LAT_DIST
+    self.vRel = np.zeros(0)       # REL_SPEED
+    self.vLead = np.zeros(0)
+    self.measured = np.zeros(0)   # measured or estimate
+    self.vLeadK = np.zeros(0)
+    self.aLeadK = np.zeros(0)
+    self.aLeadTau = np.zeros(0)
+
+  def __len__(self):
+    return len(self.identifiers)
+
+  def update(self, identifiers: np.ndarray, d_rel: np.ndarray, y_rel: np.ndarray, v_rel: np.ndarray, v_lead: np.ndarray, measured: np.ndarray):
+    if np.array_equal(identifiers, self.identifiers):
+      # the same tracks in the same order as the last update, the usual case
+      kept, new, points = slice(None), slice(0), slice(None)
+    elif len(identifiers) == 0:
+      # no points, all tracks are removed
+      kept, new, points = np.zeros(len(self.identifiers), dtype=bool), slice(0), slice(0)
+      self.identifiers = identifiers
+    else:
+      # tracks without a point are removed, points without a track start a new one
+      sorter = np.argsort(identifiers)
+      track_points = sorter[np.searchsorted(identifiers, self.identifiers, sorter=sorter).clip(max=len(identifiers) - 1)]
+      kept = identifiers[track_points] == self.identifiers
+      new = np.ones(len(identifiers), dtype=bool)
+      new[track_points[kept]] = False
+      self.identifiers = np.concatenate((self.identifiers[kept], identifiers[new]))
+      points = np.concatenate((track_points[kept], np.flatnonzero(new)))
+    n_kept = len(self.vLeadK[kept])
 
-  def update(self, d_rel: float, y_rel: float, v_rel: float, v_lead: float, measured: float):
     # relative values, copy
-    self.dRel = d_rel   # LONG_DIST
-    self.yRel = y_rel   # -LAT_DIST
-    self.vRel = v_rel   # REL_SPEED
-    self.vLead = v_lead
-    self.measured = measured   # measured or estimate
-
-    # computed velocity and accelerations
-    if self.cnt > 0:
-      self.kf.update(self.vLead)
-
-    self.vLeadK = float(self.kf.x[SPEED][0])
-    self.aLeadK = float(self.kf.x[ACCEL][0])
+    self.dRel = d_rel[points]
+    self.yRel = y_rel[points]
+    self.vRel = v_rel[points]
+    self.vLead = v_lead[points]
+    self.measured = measured[points]
+
+    # computed velocity and accelerations, new tracks start at their measured speed and aren't filtered until the next update
+    v_lead_k = np.concatenate((self.vLeadK[kept], v_lead[new]))
+    a_lead_k = np.concatenate((self.aLeadK[kept], np.zeros(len(v_lead_k) - n_kept)))
+    v, a, meas = v_lead_k[:n_kept], a_lead_k[:n_kept], self.vLead[:n_kept]
+    v_lead_k[:n_kept], a_lead_k[:n_kept] = (self.A_K[0][0] * v + self.A_K[0][1] * a + self.K[0] * meas,
+                                            self.A_K[1][0] * v + self.A_K[1][1] * a + self.K[1] * meas)
+    self.vLeadK = v_lead_k
+    self.aLeadK = a_lead_k
 
     # Learn if constant acceleration
-    if abs(self.aLeadK) < 0.5:
-      self.aLeadTau = _LEAD_ACCEL_TAU
-    else:
-      self.aLeadTau *= 0.9
-
-    self.cnt += 1
-
-  def get_key_for_cluster(self):
-    # Weigh y higher since radar is inaccurate in this dimension
-    return [self.dRel, self.yRel*2, self.vRel]
+    a_lead_tau = np.concatenate((self.aLeadTau[kept], np.full(len(v_lead_k) - n_kept, _LEAD_ACCEL_TAU)))
+    self.aLeadTau = np.where(np.abs(self.aLeadK) < 0.5, _LEAD_ACCEL_TAU, a_lead_tau * 0.9)
 
-  def reset_a_lead(self, aLeadK: float, aLeadTau: float):
-    self.kf = KF1D([[self.vLead], [aLeadK]], self.K_A, self.K_C, self.K_K)
-    self.aLeadK = aLeadK
-    self.aLeadTau = aLeadTau
-
-  def get_RadarState(self, model_prob: float = 0.0):
+  def get_RadarState(self, idx: int, model_prob: float = 0.0):
     return {
-      "dRel": float(self.dRel),
-      "yRel": float(self.yRel),
-      "vRel": float(self.vRel),
-      "vLead": float(self.vLead),
-      "vLeadK": float(self.vLeadK),
-      "aLeadK": float(self.aLeadK),
-      "aLeadTau": float(self.aLeadTau),
+      "dRel": float(self.dRel[idx]),
+      "yRel": float(self.yRel[idx]),
+      "vRel": float(self.vRel[idx]),
+      "vLead": float(self.vLead[idx]),
+      "vLeadK": float(self.vLeadK[idx]),
+      "aLeadK": float(self.aLeadK[idx]),
+      "aLeadTau": float(self.aLeadTau[idx]),
       "status": True,
       "fcw": self.is_potential_fcw(model_prob),
       "modelProb": model_prob,
       "radar": True,
-      "radarTrackId": self.identifier,
+      "radarTrackId": int(self.identifiers[idx]),
     }
 
-  def potential_low_speed_lead(self, v_ego: float):
+  def potential_low_speed_leads(self, v_ego: float):
     # stop for stuff in front of you and low speed, even without model confirmation
     # Radar points closer than 0.75, are almost always glitches on toyota radars
-    return abs(self.yRel) < 1.0 and (v_ego < V_EGO_STATIONARY) and (0.75 < self.dRel < 25)
+    return (np.abs(self.yRel) < 1.0) & (v_ego < V_EGO_STATIONARY) & (0.75 < self.dRel) & (self.dRel < 25)
 
   def is_potential_fcw(self, model_prob: float):
     return model_prob > .9
 
-  def __str__(self):
-    ret = f"x: {self.dRel:4.1f}  y: {self.yRel:4.1f}  v: {self.vRel:4.1f}  a: {self.aLeadK:4.1f}"
-    return ret
-
 
-def laplacian_pdf(x: float, mu: float, b: float):
+def laplacian_pdf(x: np.ndarray, mu: float, b: float):
   b = max(b, 1e-4)
-  return math.exp(-abs(x-mu)/b)
+  return np.exp(-np.abs(x-mu)/b)
 
 
-def match_vision_to_track(v_ego: float, lead: capnp._DynamicStructReader, tracks: dict[int, Track]):
+def match_vision_to_track(v_ego: float, lead: capnp._DynamicStructReader, tracks: Tracks) -> int | None:
   offset_vision_dist = lead.x[0] - RADAR_TO_CAMERA
 
-  def prob(c):
-    prob_d = laplacian_pdf(c.dRel, offset_vision_dist, lead.xStd[0])
-    prob_y = laplacian_pdf(c.yRel, -lead.y[0], lead.yStd[0])
-    prob_v = laplacian_pdf(c.vRel + v_ego, lead.v[0], lead.vStd[0])
+  # probability of every track being the lead
+  prob_d = laplacian_pdf(tracks.dRel, offset_vision_dist, lead.xStd[0])
+  prob_y = laplacian_pdf(tracks.yRel, -lead.y[0], lead.yStd[0])
+  prob_v = laplacian_pdf(tracks.vRel + v_ego, lead.v[0], lead.vStd[0])
 
-    # This isn't exactly right, but it's a good heuristic
-    return prob_d * prob_y * prob_v
-
-  track = max(tracks.values(), key=prob)
+  # This isn't exactly right, but it's a good heuristic
+  idx = int(np.argmax(prob_d * prob_y * prob_v))
 
   # if no 'sane' match is found return -1
   # stationary radar points can be false positives
-  dist_sane = abs(track.dRel - offset_vision_dist) < max([(offset_vision_dist)*.25, 5.0])
-  vel_sane = (abs(track.vRel + v_ego - lead.v[0]) < 10) or (v_ego + track.vRel > 3)
+  d_rel, v_rel = tracks.dRel[idx], tracks.vRel[idx]
+  dist_sane = abs(d_rel - offset_vision_dist) < max([(offset_vision_dist)*.25, 5.0])
+  vel_sane = (abs(v_rel + v_ego - lead.v[0]) < 10) or (v_ego + v_rel > 3)
   if dist_sane and vel_sane:
-    return track
+    return idx
   else:
     return None
 
@@ -167,7 +177,7 @@ def get_RadarState_from_vision(lead_msg: capnp._DynamicStructReader, v_ego: floa
   }
 
 
-def get_lead(v_ego: float, ready: bool, tracks: dict[int, Track], lead_msg: capnp._DynamicStructReader,
+def get_lead(v_ego: float, ready: bool, tracks: Tracks, lead_msg: capnp._DynamicStructReader,
              model_v_ego: float, lead_detection_threshold: float, low_speed_override: bool = True) -> dict[str, Any]:
   # Determine leads, this is where the essential logic happens
   if len(tracks) > 0 and ready and lead_msg.prob > lead_detection_threshold:
@@ -177,18 +187,18 @@ def get_lead(v_ego: float, ready: bool, tracks: dict[int, Track], lead_msg: capn
 
   lead_dict = {'status': False}
   if track is not None:
-    lead_dict = track.get_RadarState(lead_msg.prob)
+    lead_dict = tracks.get_RadarState(track, lead_msg.prob)
   elif (track is None) and ready and (lead_msg.prob > lead_detection_threshold):
     lead_dict = get_RadarState_from_vision(lead_msg, v_ego, model_v_ego)
 
   if low_speed_override:
-    low_speed_tracks = [c for c in tracks.values() if c.potential_low_speed_lead(v_ego)]
-    if len(low_speed_tracks) > 0:
-      closest_track = min(low_speed_tracks, key=lambda c: c.dRel)
+    low_speed_tracks = tracks.potential_low_speed_leads(v_ego)
+    if np.any(low_speed_tracks):
+      closest_track = int(np.argmin(np.where(low_speed_tracks, tracks.dRel, np.inf)))
 
       # Only choose new track if it is actually closer than the previous one
-      if (not lead_dict['status']) or (closest_track.dRel < lead_dict['dRel']):
-        lead_dict = closest_track.get_RadarState()
+      if (not lead_dict['status']) or (tracks.dRel[closest_track] < lead_dict['dRel']):
+        lead_dict = tracks.get_RadarState(closest_track)
 
   return lead_dict
 
@@ -199,8 +209,8 @@ class RadarD:
 
     self.current_time = 0.0
 
-    self.tracks: dict[int, Track] = {}
     self.kalman_params = KalmanParams(radar_ts)
+    self.tracks = Tracks(self.kalman_params)
 
     self.v_ego = 0.0
     self.v_ego_hist = deque([0.0], maxlen=delay+1)
@@ -237,22 +247,12 @@ class RadarD:
     for pt in radar_points:
       ar_pts[pt.trackId] = [pt.dRel, pt.yRel, pt.vRel, pt.measured]
 
-    # *** remove missing points from meta data ***
-    for ids in list(self.tracks.keys()):
-      if ids not in ar_pts:
-        self.tracks.pop(ids, None)
-
     # *** compute the tracks ***
-    for ids in ar_pts:
-      rpt = ar_pts[ids]
-
-      # align v_ego by a fixed time to align it with the radar measurement
-      v_lead = rpt[2] + self.v_ego_hist[0]
-
-      # create the track if it doesn't exist or it's a new track
-      if ids not in self.tracks:
-        self.tracks[ids] = Track(ids, v_lead, self.kalman_params)
-      self.tracks[ids].update(rpt[0], rpt[1], rpt[2], v_lead, rpt[3])
+    identifiers = np.fromiter(ar_pts.keys(), dtype=np.int64, count=len(ar_pts))
+    d_rel, y_rel, v_rel, measured = np.array(list(ar_pts.values()), dtype=np.float64).reshape(-1, 4).T
+    # align v_ego by a fixed time to align it with the radar measurement
+    v_lead = v_rel + self.v_ego_hist[0]
+    self.tracks.update(identifiers, d_rel, y_rel, v_rel, v_lead, measured)
 
     # *** publish radarState ***
     self.radar_state_valid = sm.all_checks() and len(radar_errors) == 0
@@ -289,12 +289,12 @@ class RadarD:
     # publish tracks for UI debugging (keep last)
     tracks_msg = messaging.new_message('liveTracks', len(self.tracks))
     tracks_msg.valid = self.radar_state_valid
-    for index, tid in enumerate(sorted(self.tracks.keys())):
+    for index, idx in enumerate(np.argsort(self.tracks.identifiers)):
       tracks_msg.liveTracks[index] = {
-        "trackId": tid,
-        "dRel": float(self.tracks[tid].dRel),
-        "yRel": float(self.tracks[tid].yRel),
-        "vRel": float(self.tracks[tid].vRel),
+        "trackId": int(self.tracks.identifiers[idx]),
+        "dRel": float(self.tracks.dRel[idx]),
+        "yRel": float(self.tracks.yRel[idx]),
+        "vRel": float(self.tracks.vRel[idx]),
       }
     pm.send('liveTracks', tracks_msg)
 
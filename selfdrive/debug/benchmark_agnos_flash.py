@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+import argparse
+import hashlib
+import lzma
+import os
+import resource
+import struct
+import tempfile
+import time
+
+from openpilot.system.hardware.tici.agnos import StreamingDecompressor, unsparsify, write_chunks
+
+BLOCK_SIZE = 4096
+
+
+def generate_sparse_image(fn: str, size_mb: int, raw_chunk_mb: int) -> tuple[int, str]:
+  """Writes an xz compressed android sparse image alternating raw and fill chunks, returns its unsparsified size and hash"""
+  raw_blocks = raw_chunk_mb * 1024 * 1024 // BLOCK_SIZE
+  fill_blocks = raw_blocks // 4
+  chunks = []
+  total_blocks = 0
+  while total_blocks < size_mb * 1024 * 1024 // BLOCK_SIZE:
+    chunks.append((0xcac1, raw_blocks))
+    chunks.append((0xcac2, fill_blocks))
+    total_blocks += raw_blocks + fill_blocks
+
+  raw_hash = hashlib.sha256()
+  with lzma.open(fn, 'wb', preset=0) as f:
+    f.write(struct.pack("<IHHHHIIII", 0xed26ff3a, 1, 0, 28, 12, BLOCK_SIZE, total_blocks, len(chunks), 0))
+    for chunk_type, out_blocks in chunks:
+      if chunk_type == 0xcac1:
+        data = os.urandom(1024 * 1024) * (out_blocks * BLOCK_SIZE // (1024 * 1024))
+        f.write(struct.pack("<2H2I", chunk_type, 0, out_blocks, 12 + len(data)))
+        f.write(data)
+        raw_hash.update(data)
+      else:
+        f.write(struct.pack("<2H2I", chunk_type, 0, out_blocks, 12 + 4))
+        f.write(b"\xab" * 4)
+        raw_hash.update(b"\xab" * (out_blocks * BLOCK_SIZE))
+  return total_blocks * BLOCK_SIZE, raw_hash.hexdigest()
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description='Measure AGNOS sparse image decompression and flashing throughput')
+  parser.add_argument('--size', type=int, default=512, help='unsparsified size of the generated image in MB')
+  parser.add_argument('--raw-chunk', type=int, default=128, help='size of each raw sparse chunk in MB')
+  args = parser.parse_args()
+
+  with tempfile.TemporaryDirectory() as tmp:
+    image = os.path.join(tmp, 'system.img.xz')
+    size, raw_hash = generate_sparse_image(image, args.size, args.raw_chunk)
+    print(f'image: {size / 1e6:.1f} MB unsparsified, {os.path.getsize(image) / 1e6:.1f} MB compressed')
+
+    st = time.monotonic()
+    total = sum(len(chunk) for chunk in unsparsify(StreamingDecompressor(image)))
+    dt = time.monotonic() - st
+    print(f'decompress + unsparsify: {total / 1e6 / dt:.1f} MB/s')
+
+    partition = {'name': 'benchmark', 'size': size}
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    st = time.monotonic()
+    with open(os.path.join(tmp, 'system.img'), 'wb') as out:
+      flashed_hash = write_chunks(out, unsparsify(StreamingDecompressor(image)), partition)
+    dt = time.monotonic() - st
+    rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before
+    assert flashed_hash.hexdigest() == raw_hash, "raw hash mismatch"
+    print(f'flash to file: {size / 1e6 / dt:.1f} MB/s, peak RSS increase {rss_kb / 1024:.1f} MB')
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+import argparse
+import os
+import random
+import time
+
+from panda import pack_can_buffer, unpack_can_buffer
+
+RECV_SIZE = 16384  # Panda.can_recv bulk read size
+# frames per second of a saturated bus: 500 kbit/s classic CAN with 8 byte frames, 2 Mbit/s CAN-FD data phase with 64 byte frames
+BUS_LOADS = {
+  'CAN 8 byte': (8, 4000),
+  'CAN-FD 64 byte': (64, 3000),
+}
+
+
+def run(data_len: int, frames_per_s: int, buses: int, seconds: int) -> None:
+  msgs = [(random.randint(0, 0x7ff), 0, os.urandom(data_len), random.randrange(buses)) for _ in range(frames_per_s * buses * seconds)]
+
+  st = time.process_time()
+  chunks = pack_can_buffer(msgs)
+  pack_t = time.process_time() - st
+
+  # receive side, in bulk transfer sized pieces like can_recv
+  stream = b''.join(chunks)
+  st = time.process_time()
+  overflow = b''
+  received = 0
+  for i in range(0, len(stream), RECV_SIZE):
+    ret, overflow = unpack_can_buffer(overflow + stream[i:i + RECV_SIZE])
+    received += len(ret)
+  unpack_t = time.process_time() - st
+  assert received == len(msgs)
+
+  n = len(msgs)
+  print(f'  pack:   {n / pack_t:.0f} frames/s, {pack_t / seconds * 100:.1f}% of a core at this load')
+  print(f'  unpack: {n / unpack_t:.0f} frames/s, {unpack_t / seconds * 100:.1f}% of a core at this load')
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description='Measure panda CAN buffer packing and unpacking throughput at saturated bus loads')
+  parser.add_argument('--buses', type=int, default=3)
+  parser.add_argument('--seconds', type=int, default=10, help='seconds of bus traffic to pack and unpack')
+  args = parser.parse_args()
+
+  for name, (data_len, frames_per_s) in BUS_LOADS.items():
+    print(f'{name}, {args.buses} buses at {frames_per_s} frames/s each:')
+    run(data_len, frames_per_s, args.buses, args.seconds)
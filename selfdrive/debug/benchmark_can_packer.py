@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+import argparse
+import time
+
+from opendbc.can.packer import CANMessageTemplate, CANPacker
+
+DBC = 'toyota_nodsu_pt_generated'
+# a frame's worth of messages, each sent with all its signals like the carcontrollers do
+MESSAGES = {
+  'STEERING_LKA': ('STEER_REQUEST', 'STEER_TORQUE_CMD', 'SET_ME_1', 'LKA_STATE', 'COUNTER'),
+  'LKAS_HUD': ('BARRIERS', 'RIGHT_LINE', 'LEFT_LINE', 'LKAS_STATUS', 'LDA_ALERT', 'LDW_EXIST', 'TWO_BEEPS', 'ADJUSTING_CAMERA'),
+}
+
+
+def run(name: str, make_frame, frames: int) -> None:
+  st = time.process_time()
+  for i in range(frames):
+    msgs = make_frame(i)
+  dt = time.process_time() - st
+  print(f'{name:>14}: {frames / dt:.0f} frames/s, {dt / frames / len(msgs) * 1e6:.2f} us/message')
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description='Measure CANPacker throughput of dict, template and batched template packing')
+  parser.add_argument('--frames', type=int, default=100_000)
+  args = parser.parse_args()
+
+  packer = CANPacker(DBC)
+
+  def values(i):
+    return [(name, [(i + j) % 2 for j in range(len(signals))]) for name, signals in MESSAGES.items()]
+
+  run('make_can_msg', lambda i: [packer.make_can_msg(name, 0, dict(zip(MESSAGES[name], v, strict=True))) for name, v in values(i)], args.frames)
+  if CANMessageTemplate is None:
+    print('packer_pyx was built without message templates, rebuild it to compare')
+  else:
+    templates = {name: packer.get_template(name, signals) for name, signals in MESSAGES.items()}
+    run('template', lambda i: [templates[name].make_can_msg(0, v) for name, v in values(i)], args.frames)
+    run('make_can_msgs', lambda i: packer.make_can_msgs([(templates[name], 0, v) for name, v in values(i)]), args.frames)
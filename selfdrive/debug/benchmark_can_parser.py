@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+import argparse
+import time
+
+import numpy as np
+
+from opendbc.can.packer import CANPacker
+from opendbc.can.parser import CANParser
+from openpilot.selfdrive.pandad import can_list_to_can_capnp
+
+DBC = 'toyota_nodsu_pt_generated'
+# 100 Hz messages sent on every frame, with the signals that change between frames
+MESSAGES = {
+  'STEER_ANGLE_SENSOR': ('STEER_ANGLE', 'STEER_RATE', 'STEER_FRACTION'),
+  'WHEEL_SPEEDS': ('WHEEL_SPEED_FR', 'WHEEL_SPEED_FL', 'WHEEL_SPEED_RR', 'WHEEL_SPEED_RL'),
+  'SPEED': ('SPEED', 'ENCODER'),
+  'KINEMATICS': ('ACCEL_Y', 'YAW_RATE', 'ACCEL_X'),
+  'BRAKE': ('BRAKE_AMOUNT', 'BRAKE_PEDAL'),
+  'STEERING_LKA': ('STEER_TORQUE_CMD', 'STEER_REQUEST', 'COUNTER'),
+}
+
+
+def get_can_strings(frames: int, msgs_per_packet: int) -> list[bytes]:
+  # every packet holds msgs_per_packet copies of each message, like a busy bus between two pandad reads
+  packer = CANPacker(DBC)
+  strings = []
+  for i in range(frames):
+    can_msgs = []
+    for j in range(msgs_per_packet):
+      n = i * msgs_per_packet + j
+      for name, signals in MESSAGES.items():
+        values = {s: (n % 64 if s == 'COUNTER' else n % 100) for s in signals}
+        can_msgs.append(packer.make_can_msg(name, 0, values))
+    strings.append(can_list_to_can_capnp(can_msgs))
+  return strings
+
+
+def print_times(name: str, times: list[float]) -> None:
+  us = np.array(times) * 1e6
+  print(f'{name:>12}: mean {us.mean():.1f} us, median {np.median(us):.1f} us, ' +
+        f'99th pct {np.percentile(us, 99):.1f} us, max {us.max():.1f} us')
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description='Time CANParser.update_strings on synthetic CAN packets')
+  parser.add_argument('--frames', type=int, default=5000)
+  parser.add_argument('--msgs-per-packet', type=int, default=1, help='copies of each message per packet')
+  args = parser.parse_args()
+
+  strings = get_can_strings(args.frames, args.msgs_per_packet)
+  messages = [(name, 100) for name in MESSAGES]
+  parsers = {'dict output': CANParser(DBC, messages, 0)}
+  try:
+    parsers['array output'] = CANParser(DBC, messages, 0, array_output=True)
+  except TypeError:
+    print('parser_pyx was built without array output, rebuild it to compare')
+
+  print(f'{args.frames} packets, {args.msgs_per_packet * len(MESSAGES)} CAN messages per packet')
+  for name, cp in parsers.items():
+    times = []
+    for s in strings:
+      st = time.perf_counter()
+      cp.update_strings([s])
+      times.append(time.perf_counter() - st)
+    print_times(name, times)
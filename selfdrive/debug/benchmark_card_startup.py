@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+import argparse
+import multiprocessing
+import sys
+import time
+
+
+def measure(car_model: str, q) -> None:
+  times = {}
+  st = time.monotonic()
+  from openpilot.common.params import Params
+  from openpilot.selfdrive.car import gen_empty_fingerprint
+  from openpilot.selfdrive.car.car_helpers import get_car_interface, interfaces
+  times['import car_helpers'] = time.monotonic() - st
+  car_modules = sum(m.startswith('openpilot.selfdrive.car.') for m in sys.modules)
+
+  st = time.monotonic()
+  CarInterface, _, _ = interfaces[car_model]
+  times['load interface'] = time.monotonic() - st
+
+  st = time.monotonic()
+  CP = CarInterface.get_params(car_model, gen_empty_fingerprint(), [], False, False, Params(), docs=False)
+  times['get_params'] = time.monotonic() - st
+
+  st = time.monotonic()
+  get_car_interface(CP)
+  times['create interface'] = time.monotonic() - st
+
+  q.put((times, car_modules, sum(m.startswith('openpilot.selfdrive.car.') for m in sys.modules)))
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description='Measure the time from starting card to having a car interface, excluding the FW query')
+  parser.add_argument('--model', default='TOYOTA_COROLLA_TSS2')
+  parser.add_argument('--runs', type=int, default=5)
+  args = parser.parse_args()
+
+  ctx = multiprocessing.get_context('spawn')
+  results: dict[str, list[float]] = {}
+  for _ in range(args.runs):
+    # run in a fresh process so nothing is imported yet
+    q = ctx.Queue()
+    p = ctx.Process(target=measure, args=(args.model, q))
+    p.start()
+    times, modules_before, modules_after = q.get()
+    p.join()
+    for name, t in times.items():
+      results.setdefault(name, []).append(t)
+
+  for name, ts in results.items():
+    print(f'{name:>18}: mean {sum(ts) / len(ts) * 1e3:.1f} ms, min {min(ts) * 1e3:.1f} ms')
+  total = [sum(ts) for ts in zip(*results.values(), strict=True)]
+  print(f'{"total":>18}: mean {sum(total) / len(total) * 1e3:.1f} ms, min {min(total) * 1e3:.1f} ms')
+  print(f'car modules imported: {modules_before} after car_helpers import, {modules_after} with the interface')
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+import argparse
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from openpilot.system.loggerd import deleter
+from openpilot.system.loggerd.config import get_available_bytes
+
+# name and share of the segment size of every file in a segment
+SEGMENT_FILES = (('fcamera.hevc', 0.45), ('ecamera.hevc', 0.3), ('dcamera.hevc', 0.15), ('qcamera.ts', 0.05), ('rlog', 0.04), ('qlog', 0.01))
+
+
+def create_segments(log_root: str, count: int, segment_size: int) -> None:
+  data = os.urandom(segment_size)
+  for i in range(count):
+    segment_dir = os.path.join(log_root, f'0000002a--0123456789--{i}')
+    os.mkdir(segment_dir)
+    for name, share in SEGMENT_FILES:
+      with open(os.path.join(segment_dir, name), 'wb') as f:
+        f.write(data[:int(segment_size * share)])
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description='Measure how long the deleter takes to free space on a tmpfs filled with synthetic segments')
+  parser.add_argument('--root', default='/dev/shm', help='tmpfs to create the segments in')
+  parser.add_argument('--segments', type=int, default=40)
+  parser.add_argument('--segment-size', type=int, default=50, help='segment size in MB')
+  parser.add_argument('--free', type=int, default=1000, help='MB the deleter needs to free')
+  parser.add_argument('--rate', type=float, default=deleter.DELETE_RATE, help='unlinks per second, 0 is unlimited')
+  args = parser.parse_args()
+
+  log_root = tempfile.mkdtemp(dir=args.root)
+  os.environ['LOG_ROOT'] = log_root
+  try:
+    create_segments(log_root, args.segments, args.segment_size * 1024 * 1024)
+
+    # only the byte limit is used, set so that --free MB need to be deleted
+    deleter.MIN_PERCENT = 0
+    deleter.MIN_BYTES = get_available_bytes() + args.free * 1024 * 1024
+    deleter.DELETE_RATE = args.rate
+
+    exit_event = threading.Event()
+    thread = threading.Thread(target=deleter.deleter_thread, args=(exit_event,))
+    st = time.monotonic()
+    thread.start()
+    while get_available_bytes() < deleter.MIN_BYTES:
+      time.sleep(0.001)
+    t = time.monotonic() - st
+    exit_event.set()
+    thread.join()
+
+    remaining = len(os.listdir(log_root))
+    print(f'freed {args.free} MB in {t * 1e3:.1f} ms, deleted {args.segments - remaining} of {args.segments} segments, ' +
+          f'rate limit {args.rate:.0f} unlinks/s')
+  finally:
+    shutil.rmtree(log_root)
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+import argparse
+import random
+import time
+
+from cereal import car
+from openpilot.selfdrive.car.fw_versions import FW_QUERY_CONFIGS, VERSIONS, get_exact_match_index, get_fuzzy_match_index, \
+                                               match_fw_to_car
+
+Ecu = car.CarParams.Ecu
+
+
+def get_car_fw(brand: str, fws: dict) -> list:
+  """FW responses as they would come back from querying a car with these ECUs"""
+  config = FW_QUERY_CONFIGS[brand]
+  car_fw = []
+  for (ecu, addr, sub_addr), versions in fws.items():
+    if ecu == Ecu.debug:
+      continue
+    for request in config.requests:
+      if request.logging or (len(request.whitelist_ecus) and ecu not in request.whitelist_ecus):
+        continue
+      f = car.CarParams.CarFw.new_message(ecu=ecu, address=addr, fwVersion=random.choice(versions), brand=brand, request=request.request)
+      if sub_addr is not None:
+        f.subAddress = sub_addr
+      car_fw.append(f)
+  return car_fw
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description='Measure the cost of FW fingerprinting every car in the fingerprints database')
+  parser.add_argument('--rounds', type=int, default=5)
+  args = parser.parse_args()
+
+  st = time.monotonic()
+  for brand in (*VERSIONS, None):
+    get_exact_match_index(brand)
+    get_fuzzy_match_index(brand)
+  print(f'index build: {(time.monotonic() - st) * 1e3:.1f} ms')
+
+  cars = [(brand, candidate, get_car_fw(brand, fws)) for brand, cars in VERSIONS.items() for candidate, fws in cars.items()]
+
+  times = []
+  correct = 0
+  for _ in range(args.rounds):
+    for brand, candidate, car_fw in cars:
+      st = time.monotonic()
+      _, matches = match_fw_to_car(car_fw, '', log=False)
+      times.append(time.monotonic() - st)
+      correct += matches == {candidate}
+
+  times_ms = sorted(t * 1e3 for t in times)
+  print(f'{len(cars)} cars, {args.rounds} rounds: {correct / args.rounds:.0f} uniquely matched')
+  print(f'match_fw_to_car: mean {sum(times_ms) / len(times_ms):.3f} ms, p50 {times_ms[len(times_ms) // 2]:.3f} ms, ' +
+        f'p99 {times_ms[int(len(times_ms) * 0.99)]:.3f} ms, max {times_ms[-1]:.3f} ms')
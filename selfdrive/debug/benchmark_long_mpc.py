@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+import argparse
+import time
+from types import SimpleNamespace
+
+import numpy as np
+
+from openpilot.selfdrive.controls.lib.longitudinal_mpc_lib.long_mpc import LongitudinalMpc
+from openpilot.selfdrive.controls.lib.longitudinal_planner import LongitudinalPlanner
+from openpilot.tools.lib.logreader import LogReader
+
+INPUT_SERVICES = ('carState', 'controlsState', 'radarState', 'frogpilotPlan')
+
+
+def get_inputs(lr, max_cycles: int) -> list[dict]:
+  # one set of planner inputs per modelV2, using the latest of every other service
+  latest = {}
+  inputs = []
+  for msg in lr:
+    which = msg.which()
+    if which in INPUT_SERVICES:
+      latest[which] = getattr(msg, which)
+    elif which == 'modelV2' and all(s in latest for s in INPUT_SERVICES):
+      CS, controls_state, fp = latest['carState'], latest['controlsState'], latest['frogpilotPlan']
+      x, v, a, j = LongitudinalPlanner.parse_model(msg.modelV2, 0., CS.vEgo, False)
+      inputs.append({
+        'mode': 'blended' if controls_state.experimentalMode else 'acc',
+        'weights': (fp.accelerationJerk, fp.dangerJerk, fp.speedJerk, not CS.standstill),
+        'personality': controls_state.personality,
+        'accel_limits': (min(fp.minAcceleration, CS.aEgo + 0.05), max(fp.maxAcceleration, CS.aEgo - 0.05)),
+        'state': (CS.vEgo, CS.aEgo),
+        'leads': (latest['radarState'].leadOne, latest['radarState'].leadTwo),
+        'v_cruise': fp.vCruise,
+        'trajectory': (x, v, a, j),
+        't_follow': fp.tFollow,
+      })
+      if len(inputs) >= max_cycles:
+        break
+  return inputs
+
+
+def print_times(name: str, times: list[float]) -> None:
+  ms = np.array(times) * 1e3
+  print(f'{name:>12}: mean {ms.mean():.3f} ms, median {np.median(ms):.3f} ms, ' +
+        f'99th pct {np.percentile(ms, 99):.3f} ms, max {ms.max():.3f} ms')
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description='Time LongitudinalMpc.update on the planner inputs of a recorded route')
+  parser.add_argument('route', help='route or segment with radarState, modelV2 and frogpilotPlan')
+  parser.add_argument('--max-cycles', type=int, default=6000)
+  args = parser.parse_args()
+
+  inputs = get_inputs(LogReader(args.route), args.max_cycles)
+  assert len(inputs), 'no planner inputs found in route'
+
+  toggles = SimpleNamespace(increased_stopping_distance=0, radarless_model=False)
+  mpc = LongitudinalMpc()
+  weights_times, update_times, solve_times = [], [], []
+  for cycle in inputs:
+    mpc.mode = cycle['mode']
+
+    st = time.monotonic()
+    mpc.set_weights(*cycle['weights'], personality=cycle['personality'])
+    weights_times.append(time.monotonic() - st)
+
+    mpc.set_accel_limits(*cycle['accel_limits'])
+    mpc.set_cur_state(*cycle['state'])
+    # update modifies the trajectory in place
+    x, v, a, j = (np.copy(t) for t in cycle['trajectory'])
+
+    st = time.monotonic()
+    mpc.update(*cycle['leads'], cycle['v_cruise'], x, v, a, j, cycle['t_follow'], False, toggles, personality=cycle['personality'])
+    update_times.append(time.monotonic() - st)
+    solve_times.append(mpc.solve_time)
+
+  stage_io = 'bulk set_all_stages/get_all_stages' if mpc.bulk_stage_io else 'per-stage set/get (prebuilt solver)'
+  print(f'{len(inputs)} planner cycles, solver I/O: {stage_io}')
+  print_times('set_weights', weights_times)
+  print_times('update', update_times)
+  print_times('acados solve', solve_times)
+  # time spent in python and the solver interface
+  print_times('overhead', [u - s for u, s in zip(update_times, solve_times, strict=True)])
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+import argparse
+import os
+import time
+
+import numpy as np
+
+from openpilot.selfdrive.car.interfaces import TORQUE_NN_MODEL_PATH, get_nn_model
+from openpilot.selfdrive.car.torque_data.build_lat_models import load_json_model
+
+
+def get_inputs(rng, input_size: int) -> list[list[float]]:
+  # setpoint, measurement, error and feedforward inputs of one LatControlTorque cycle
+  return [list(rng.normal(size=input_size)) for _ in range(3)] + [list(rng.normal(size=4))]
+
+
+def print_times(name: str, times: list[float]) -> None:
+  us = np.array(times) * 1e6
+  print(f'{name:>14}: mean {us.mean():.1f} us, median {np.median(us):.1f} us, ' +
+        f'99th pct {np.percentile(us, 99):.1f} us, max {us.max():.1f} us')
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description='Measure NNFF torque model load time and per-cycle evaluation latency')
+  parser.add_argument('model', nargs='?', default='CHEVROLET_EQUINOX', help='model name in torque_data/lat_models')
+  parser.add_argument('--eps-firmware', default='', help='EPS firmware version used in the model lookup')
+  parser.add_argument('--cycles', type=int, default=20000)
+  args = parser.parse_args()
+
+  # what the car interface does on init, the first load also reads the model store
+  st = time.perf_counter()
+  model = get_nn_model(args.model, args.eps_firmware)
+  load_t = time.perf_counter() - st
+  assert model is not None, f'no model found for {args.model}'
+
+  st = time.perf_counter()
+  load_json_model(os.path.join(TORQUE_NN_MODEL_PATH, f'{args.model}.json'))
+  json_t = time.perf_counter() - st
+  print(f'model lookup and load: {load_t * 1e3:.2f} ms, parsing the json weights alone: {json_t * 1e3:.2f} ms')
+
+  rng = np.random.default_rng(0)
+  inputs = [get_inputs(rng, model.input_size) for _ in range(args.cycles)]
+
+  single_times, batch_times = [], []
+  for cycle_inputs in inputs:
+    st = time.perf_counter()
+    for input_array in cycle_inputs:
+      model.evaluate(input_array)
+    single_times.append(time.perf_counter() - st)
+
+    st = time.perf_counter()
+    model.evaluate_batch(cycle_inputs)
+    batch_times.append(time.perf_counter() - st)
+
+  print(f'{args.cycles} cycles of {len(inputs[0])} evaluations, {args.model}')
+  print_times('evaluate', single_times)
+  print_times('evaluate_batch', batch_times)
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+import argparse
+import time
+
+import numpy as np
+
+from cereal import log
+from openpilot.selfdrive.controls.radard import RADAR_TO_CAMERA, KalmanParams, Tracks, get_lead
+
+RADAR_TS = 0.05
+
+
+def get_points(rng, n_tracks: int, cycles: int) -> list[tuple[np.ndarray, ...]]:
+  # a field of n_tracks targets moving with small noise, a few tracks are dropped and replaced by new ids every cycle
+  identifiers = np.arange(n_tracks)
+  next_id = n_tracks
+  d_rel = rng.uniform(5., 100., n_tracks)
+  y_rel = rng.uniform(-5., 5., n_tracks)
+  v_rel = rng.uniform(-5., 5., n_tracks)
+  points = []
+  for _ in range(cycles):
+    replaced = rng.random(n_tracks) < 0.02
+    identifiers = np.where(replaced, np.arange(next_id, next_id + n_tracks), identifiers)
+    next_id += n_tracks
+    d_rel = d_rel + v_rel * RADAR_TS + rng.normal(0., 0.1, n_tracks)
+    v_rel = v_rel + rng.normal(0., 0.1, n_tracks)
+    points.append((identifiers, d_rel, y_rel + rng.normal(0., 0.05, n_tracks), v_rel, np.ones(n_tracks)))
+  return points
+
+
+def get_lead_msg(d_rel: float, y_rel: float, v_lead: float):
+  return log.ModelDataV2.LeadDataV3.new_message(prob=0.9, x=[d_rel + RADAR_TO_CAMERA], xStd=[1.], y=[-y_rel], yStd=[0.5],
+                                                v=[v_lead], vStd=[1.], a=[0.], aStd=[1.])
+
+
+def print_times(name: str, times: list[float]) -> None:
+  us = np.array(times) * 1e6
+  print(f'{name:>10}: mean {us.mean():.1f} us, median {np.median(us):.1f} us, ' +
+        f'99th pct {np.percentile(us, 99):.1f} us, max {us.max():.1f} us')
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description='Time the radard track update and lead association on synthetic radar loads')
+  parser.add_argument('--tracks', type=int, nargs='+', default=[16, 32, 64], help='number of radar tracks per cycle')
+  parser.add_argument('--cycles', type=int, default=6000)
+  parser.add_argument('--lead-detection-threshold', type=float, default=0.5)
+  args = parser.parse_args()
+
+  rng = np.random.default_rng(0)
+  v_ego = 20.
+  for n_tracks in args.tracks:
+    points = get_points(rng, n_tracks, args.cycles)
+    # the model leads follow the two closest targets in the first cycle
+    closest = np.argsort(points[0][1])[:2]
+    lead_msgs = [get_lead_msg(points[0][1][i], points[0][2][i], points[0][3][i] + v_ego) for i in closest]
+
+    tracks = Tracks(KalmanParams(RADAR_TS))
+    update_times, lead_times = [], []
+    for identifiers, d_rel, y_rel, v_rel, measured in points:
+      st = time.perf_counter()
+      tracks.update(identifiers, d_rel, y_rel, v_rel, v_rel + v_ego, measured)
+      update_times.append(time.perf_counter() - st)
+
+      st = time.perf_counter()
+      get_lead(v_ego, True, tracks, lead_msgs[0], v_ego, args.lead_detection_threshold, low_speed_override=True)
+      get_lead(v_ego, True, tracks, lead_msgs[1], v_ego, args.lead_detection_threshold, low_speed_override=False)
+      lead_times.append(time.perf_counter() - st)
+
+    print(f'{args.cycles} cycles, {n_tracks} tracks')
+    print_times('update', update_times)
+    print_times('get_lead', lead_times)
+    print_times('total', [u + lt for u, lt in zip(update_times, lead_times, strict=True)])
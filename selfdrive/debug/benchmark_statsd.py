@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+import argparse
+import random
+import threading
+import time
+from collections import defaultdict
+
+import zmq
+
+from openpilot.system.statsd import METRIC_TYPE, QuantileSketch, get_sample_stats, ingest_metric
+
+BENCHMARK_SOCKET = "ipc:///tmp/stats_benchmark"
+
+
+def push_metrics(n: int, n_names: int) -> None:
+  ctx = zmq.Context.instance()
+  sock = ctx.socket(zmq.PUSH)
+  sock.connect(BENCHMARK_SOCKET)
+  for i in range(n):
+    sock.send_string(f"timing_{i % n_names}:{random.lognormvariate(0, 1):.4f}|{METRIC_TYPE.SAMPLE}")
+  sock.close()
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description='Measure statsd SAMPLE ingest throughput on the PULL socket')
+  parser.add_argument('--samples', type=int, default=500_000)
+  parser.add_argument('--names', type=int, default=20, help='number of distinct metric names')
+  args = parser.parse_args()
+
+  ctx = zmq.Context.instance()
+  sock = ctx.socket(zmq.PULL)
+  sock.bind(BENCHMARK_SOCKET)
+
+  gauges: dict[str, float] = {}
+  samples: dict[str, QuantileSketch] = defaultdict(QuantileSketch)
+
+  pusher = threading.Thread(target=push_metrics, args=(args.samples, args.names))
+  st = time.monotonic()
+  pusher.start()
+  for _ in range(args.samples):
+    ingest_metric(sock.recv_string(), gauges, samples)
+  ingest_t = time.monotonic() - st
+  pusher.join()
+
+  st = time.monotonic()
+  stats = {name: get_sample_stats(sketch) for name, sketch in samples.items()}
+  flush_t = time.monotonic() - st
+
+  buckets = sum(len(s.positive) + len(s.negative) for s in samples.values())
+  print(f'ingest: {args.samples} samples in {ingest_t:.2f} s, {args.samples / ingest_t:.0f} samples/s')
+  print(f'flush: {len(stats)} metrics in {flush_t * 1e3:.2f} ms, {buckets} sketch buckets in total')
+  sock.close()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+import argparse
+import bz2
+import io
+import multiprocessing
+import os
+import resource
+import tempfile
+import time
+
+from openpilot.common.file_helpers import Bz2CompressingReader
+
+READ_SIZE = 8192  # block size http.client reads request bodies with
+
+
+def generate_log(fn: str, size_mb: int) -> None:
+  # mix of compressible and random data, roughly like an rlog
+  with open(fn, 'wb') as f:
+    for _ in range(size_mb):
+      f.write(os.urandom(256 * 1024) + bytes(768 * 1024))
+
+
+def drain(data) -> int:
+  total = 0
+  while chunk := data.read(READ_SIZE):
+    total += len(chunk)
+  return total
+
+
+def run_full(fn: str) -> int:
+  with open(fn, 'rb') as f:
+    return drain(io.BytesIO(bz2.compress(f.read())))
+
+
+def run_streaming(fn: str) -> int:
+  with open(fn, 'rb') as f:
+    return drain(Bz2CompressingReader(f))
+
+
+def measure(target, fn: str, q) -> None:
+  rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+  st = time.monotonic()
+  size = target(fn)
+  dt = time.monotonic() - st
+  q.put((size, dt, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before))
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description='Compare peak memory and throughput of in-memory vs streaming bz2 upload bodies')
+  parser.add_argument('--size', type=int, default=50, help='size of the generated log in MB')
+  parser.add_argument('file', nargs='?', help='existing file to compress instead of a generated one')
+  args = parser.parse_args()
+
+  with tempfile.TemporaryDirectory() as tmp:
+    fn = args.file
+    if fn is None:
+      fn = os.path.join(tmp, 'rlog')
+      generate_log(fn, args.size)
+    raw_size = os.path.getsize(fn)
+
+    ctx = multiprocessing.get_context('spawn')
+    for name, target in (('bz2.compress', run_full), ('streaming', run_streaming)):
+      # run in a fresh process so peak RSS isn't shared between methods
+      q = ctx.Queue()
+      p = ctx.Process(target=measure, args=(target, fn, q))
+      p.start()
+      size, dt, rss_kb = q.get()
+      p.join()
+      print(f'{name:>14}: {raw_size / 1e6:.1f} MB -> {size / 1e6:.1f} MB in {dt:.2f} s, ' +
+            f'{raw_size / 1e6 / dt:.1f} MB/s, peak RSS increase {rss_kb / 1024:.1f} MB')
@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+import argparse
+
+import numpy as np
+
+import cereal.messaging as messaging
+from openpilot.tools.lib.logreader import LogReader
+
+
+def print_latency(latencies: list[float]) -> None:
+  ms = np.array(latencies) / 1e6
+  print(f'{len(ms)} plans, modelV2 -> longitudinalPlan: mean {ms.mean():.2f} ms, median {np.median(ms):.2f} ms, ' +
+        f'99th pct {np.percentile(ms, 99):.2f} ms, max {ms.max():.2f} ms')
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description='Measure the time from modelV2 to the longitudinalPlan computed from it. ' +
+                                               'Compare runs with COLOCATED_PLANNERS=0 and COLOCATED_PLANNERS=1')
+  parser.add_argument('route', nargs='?', help='route or segment to read the plans from, live if not set')
+  parser.add_argument('--count', type=int, default=1200, help='number of live plans to measure')
+  args = parser.parse_args()
+
+  # longitudinalPlan.modelMonoTime is the logMonoTime of the modelV2 the plan was computed from
+  if args.route is not None:
+    latencies = [m.logMonoTime - m.longitudinalPlan.modelMonoTime for m in LogReader(args.route) if m.which() == 'longitudinalPlan']
+  else:
+    sock = messaging.sub_sock('longitudinalPlan', conflate=False)
+    latencies = []
+    while len(latencies) < args.count:
+      for m in messaging.drain_sock(sock, wait_for_one=True):
+        latencies.append(m.logMonoTime - m.longitudinalPlan.modelMonoTime)
+
+  print_latency(latencies)
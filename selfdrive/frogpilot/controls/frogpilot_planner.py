@@ -367,3 +367,4 @@ class FrogPilotPlanner:
     frogpilotPlan.vCruise = self.v_cruise
 
     pm.send('frogpilotPlan', frogpilot_plan_send)
+    return frogpilot_plan_send
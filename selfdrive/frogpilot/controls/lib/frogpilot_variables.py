@@ -16,6 +16,10 @@ CITY_SPEED_LIMIT = 25  # 55mph is typically the minimum speed for highways
 CRUISING_SPEED = 5     # Roughly the speed cars go when not touching the gas while in drive
 PROBABILITY = 0.6      # 60% chance of condition being true
 
+# run FrogPilotPlanner in plannerd instead of in frogpilot_process, the longitudinal planner then uses
+# the frogpilotPlan of the current modelV2 instead of waiting for the next one
+COLOCATED_PLANNERS = bool(int(os.getenv("COLOCATED_PLANNERS", "0")))
+
 class FrogPilotVariables:
   def __init__(self):
     self.frogpilot_toggles = SimpleNamespace()
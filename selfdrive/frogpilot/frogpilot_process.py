@@ -10,7 +10,7 @@ from openpilot.system.hardware import HARDWARE
 
 from openpilot.selfdrive.frogpilot.controls.frogpilot_planner import FrogPilotPlanner
 from openpilot.selfdrive.frogpilot.controls.lib.frogpilot_functions import backup_toggles, is_url_pingable
-from openpilot.selfdrive.frogpilot.controls.lib.frogpilot_variables import FrogPilotVariables
+from openpilot.selfdrive.frogpilot.controls.lib.frogpilot_variables import COLOCATED_PLANNERS, FrogPilotVariables
 from openpilot.selfdrive.frogpilot.controls.lib.model_manager import DEFAULT_MODEL, DEFAULT_MODEL_NAME, download_all_models, download_model, update_models
 from openpilot.selfdrive.frogpilot.controls.lib.theme_manager import ThemeManager
 
@@ -95,7 +95,8 @@ def frogpilot_thread():
   params_memory = Params("/dev/shm/params")
   params_storage = Params("/persist/params")
 
-  frogpilot_planner = FrogPilotPlanner()
+  # plannerd runs the FrogPilotPlanner when colocated, only the background tasks are left here
+  frogpilot_planner = None if COLOCATED_PLANNERS else FrogPilotPlanner()
   theme_manager = ThemeManager()
 
   run_time_checks = False
@@ -103,10 +104,14 @@ def frogpilot_thread():
   time_validated = system_time_valid()
   update_toggles = False
 
-  pm = messaging.PubMaster(['frogpilotPlan'])
-  sm = messaging.SubMaster(['carState', 'controlsState', 'deviceState', 'frogpilotCarControl',
-                            'frogpilotCarState', 'frogpilotNavigation', 'modelV2', 'radarState'],
-                            poll='modelV2', ignore_avg_freq=['radarState'])
+  if COLOCATED_PLANNERS:
+    pm = None
+    sm = messaging.SubMaster(['deviceState'], poll='deviceState')
+  else:
+    pm = messaging.PubMaster(['frogpilotPlan'])
+    sm = messaging.SubMaster(['carState', 'controlsState', 'deviceState', 'frogpilotCarControl',
+                              'frogpilotCarState', 'frogpilotNavigation', 'modelV2', 'radarState'],
+                              poll='modelV2', ignore_avg_freq=['radarState'])
 
   while True:
     sm.update()
@@ -115,10 +120,10 @@ def frogpilot_thread():
     deviceState = sm['deviceState']
     started = deviceState.started
 
-    if not started and started_previously:
+    if frogpilot_planner is not None and not started and started_previously:
       frogpilot_planner = FrogPilotPlanner()
 
-    if started and sm.updated['modelV2']:
+    if frogpilot_planner is not None and started and sm.updated['modelV2']:
       frogpilot_planner.update(sm['carState'], sm['controlsState'], sm['frogpilotCarControl'], sm['frogpilotCarState'],
                                sm['frogpilotNavigation'], sm['modelV2'], sm['radarState'], frogpilot_toggles)
       frogpilot_planner.publish(sm, pm, frogpilot_toggles)
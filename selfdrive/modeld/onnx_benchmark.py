@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+import argparse
+import time
+import numpy as np
+from pathlib import Path
+
+from openpilot.selfdrive.modeld.runners.onnxmodel import ONNXModel
+
+MODEL_PATH = Path(__file__).parent / 'models/supercombo.onnx'
+MODEL_WIDTH = 512
+MODEL_HEIGHT = 256
+
+
+def yuv420_to_model_frame(yuv, width, height):
+  # nearest neighbour resize of a yuv420p frame into the 6 channel layout produced by loadyuv
+  y = yuv[:width * height].reshape(height, width)
+  u = yuv[width * height:width * height * 5 // 4].reshape(height // 2, width // 2)
+  v = yuv[width * height * 5 // 4:].reshape(height // 2, width // 2)
+  rows = np.linspace(0, height - 1, MODEL_HEIGHT).astype(int)
+  cols = np.linspace(0, width - 1, MODEL_WIDTH).astype(int)
+  y = y[rows][:, cols]
+  u = u[rows[::2] // 2][:, cols[::2] // 2]
+  v = v[rows[::2] // 2][:, cols[::2] // 2]
+  return np.stack([y[0::2, 0::2], y[1::2, 0::2], y[0::2, 1::2], y[1::2, 1::2], u, v]).astype(np.float32)
+
+
+def load_video_frames(fn, count):
+  from openpilot.tools.lib.framereader import FrameReader
+  fr = FrameReader(fn)
+  count = min(count, fr.frame_count)
+  frames = fr.get(0, count, pix_fmt='yuv420p')
+  return [yuv420_to_model_frame(f, fr.w, fr.h) for f in frames]
+
+
+def get_inputs(model, frames, batch_size, frame_idx):
+  inputs = {}
+  for name in model.input_names:
+    shape = model.input_shapes[name][1:]
+    if name in ('input_imgs', 'big_input_imgs') and frames is not None:
+      imgs = [np.concatenate([frames[(frame_idx + i) % len(frames)], frames[(frame_idx + i + 1) % len(frames)]]) for i in range(batch_size)]
+      inputs[name] = np.stack(imgs).reshape(batch_size, -1)
+    else:
+      inputs[name] = np.random.rand(batch_size, int(np.prod(shape))).astype(np.float32)
+  return inputs
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description='Benchmark the ONNX (CPU) model runner')
+  parser.add_argument('--model', default=str(MODEL_PATH), help='path to the onnx model')
+  parser.add_argument('--video', help='hevc/raw video from a logged route used as image input, random input otherwise')
+  parser.add_argument('--frames', type=int, default=200, help='number of frames to run')
+  parser.add_argument('--batch', type=int, default=1, help='frames per session call')
+  parser.add_argument('--warmup', type=int, default=5, help='number of untimed session calls')
+  args = parser.parse_args()
+
+  st = time.monotonic()
+  model = ONNXModel(args.model, None, None, False, None)
+  print(f'model load: {time.monotonic() - st:.2f} s, dynamic batch: {model.dynamic_batch}')
+
+  frames = load_video_frames(args.video, args.frames + 1) if args.video else None
+
+  for i in range(args.warmup):
+    model.execute_batch(get_inputs(model, frames, args.batch, i))
+
+  latencies = []
+  total_st = time.monotonic()
+  for i in range(0, args.frames, args.batch):
+    inputs = get_inputs(model, frames, args.batch, i)
+    st = time.monotonic()
+    model.execute_batch(inputs)
+    latencies.append((time.monotonic() - st) / args.batch)
+  total_t = time.monotonic() - total_st
+
+  latencies_ms = np.array(latencies) * 1e3
+  n_frames = len(latencies) * args.batch
+  print(f'{n_frames} frames, batch size {args.batch}: {n_frames / total_t:.2f} frames/s')
+  print(f'latency per frame: mean {np.mean(latencies_ms):.2f} ms, ' +
+        ', '.join(f'p{p} {np.percentile(latencies_ms, p):.2f} ms' for p in (50, 90, 99)) +
+        f', max {np.max(latencies_ms):.2f} ms')
@@ -1,12 +1,20 @@
 import onnx
+import hashlib
 import itertools
 import os
 import sys
 import numpy as np
 from typing import Any
 
+from openpilot.common.file_helpers import atomic_write_in_dir
+from openpilot.system.hardware.hw import Paths
 from openpilot.selfdrive.modeld.runners.runmodel_pyx import RunModel
 
+ONNX_THREADS = int(os.getenv('ONNX_THREADS', '2'))
+# comma separated list of CPU ids per intra-op worker thread, e.g. "1,2;3,4" (see onnxruntime session.intra_op_thread_affinities)
+ONNX_AFFINITY = os.getenv('ONNX_AFFINITY', '')
+ONNX_CACHE_DIR = os.getenv('ONNX_CACHE_DIR', os.path.join(Paths.comma_home(), 'onnx_cache'))
+
 ORT_TYPES_TO_NP_TYPES = {'tensor(float16)': np.float16, 'tensor(float)': np.float32, 'tensor(uint8)': np.uint8}
 
 def attributeproto_fp16_to_fp32(attr):
@@ -29,6 +37,27 @@ def convert_fp16_to_fp32(path):
           attributeproto_fp16_to_fp32(a.t)
   return model.SerializeToString()
 
+def get_fp32_model(path):
+  """Returns the fp32 converted model, converting and caching it on disk on first use"""
+  h = hashlib.sha256()
+  with open(path, 'rb') as f:
+    for chunk in iter(lambda: f.read(1024 * 1024), b''):
+      h.update(chunk)
+  cache_path = os.path.join(ONNX_CACHE_DIR, f'{os.path.basename(path)}.{h.hexdigest()[:16]}.fp32.onnx')
+
+  if os.path.isfile(cache_path):
+    with open(cache_path, 'rb') as f:
+      return f.read()
+
+  model_data = convert_fp16_to_fp32(path)
+  try:
+    os.makedirs(ONNX_CACHE_DIR, exist_ok=True)
+    with atomic_write_in_dir(cache_path, mode='wb', overwrite=True) as f:
+      f.write(model_data)
+  except OSError as e:
+    print(f"Onnx failed to cache converted model: {e}", file=sys.stderr)
+  return model_data
+
 def create_ort_session(path, fp16_to_fp32):
   os.environ["OMP_NUM_THREADS"] = "4"
   os.environ["OMP_WAIT_POLICY"] = "PASSIVE"
@@ -42,15 +71,17 @@ def create_ort_session(path, fp16_to_fp32):
   if 'OpenVINOExecutionProvider' in ort.get_available_providers() and 'ONNXCPU' not in os.environ:
     provider = 'OpenVINOExecutionProvider'
   elif 'CUDAExecutionProvider' in ort.get_available_providers() and 'ONNXCPU' not in os.environ:
-    options.intra_op_num_threads = 2
+    options.intra_op_num_threads = ONNX_THREADS
     provider = ('CUDAExecutionProvider', {'cudnn_conv_algo_search': 'DEFAULT'})
   else:
-    options.intra_op_num_threads = 2
+    options.intra_op_num_threads = ONNX_THREADS
     options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
     options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    if ONNX_AFFINITY:
+      options.add_session_config_entry('session.intra_op_thread_affinities', ONNX_AFFINITY)
     provider = 'CPUExecutionProvider'
 
-  model_data = convert_fp16_to_fp32(path) if fp16_to_fp32 else path
+  model_data = get_fp32_model(path) if fp16_to_fp32 else path
   print("Onnx selected provider: ", [provider], file=sys.stderr)
   ort_session = ort.InferenceSession(model_data, options, providers=[provider])
   print("Onnx using ", ort_session.get_providers(), file=sys.stderr)
@@ -67,6 +98,8 @@ class ONNXModel(RunModel):
     self.input_names = [x.name for x in self.session.get_inputs()]
     self.input_shapes = {x.name: [1, *x.shape[1:]] for x in self.session.get_inputs()}
     self.input_dtypes = {x.name: ORT_TYPES_TO_NP_TYPES[x.type] for x in self.session.get_inputs()}
+    # a symbolic leading dimension means the model accepts several frames per session call
+    self.dynamic_batch = all(not isinstance(x.shape[0], int) for x in self.session.get_inputs())
 
     # run once to initialize CUDA provider
     if "CUDAExecutionProvider" in self.session.get_providers():
@@ -84,10 +117,31 @@ class ONNXModel(RunModel):
   def getCLBuffer(self, name):
     return None
 
+  def prepare_inputs(self, inputs, batch_size=1):
+    inputs = {k: (v.view(np.uint8) / 255. if self.use_tf8 and k == 'input_img' else v) for k,v in inputs.items()}
+    return {k: v.reshape([batch_size, *self.input_shapes[k][1:]]).astype(self.input_dtypes[k]) for k,v in inputs.items()}
+
   def execute(self):
-    inputs = {k: (v.view(np.uint8) / 255. if self.use_tf8 and k == 'input_img' else v) for k,v in self.inputs.items()}
-    inputs = {k: v.reshape(self.input_shapes[k]).astype(self.input_dtypes[k]) for k,v in inputs.items()}
-    outputs = self.session.run(None, inputs)
+    outputs = self.session.run(None, self.prepare_inputs(self.inputs))
     assert len(outputs) == 1, "Only single model outputs are supported"
     self.output[:] = outputs[0]
     return self.output
+
+  def execute_batch(self, inputs):
+    """Offline mode: runs a batch of independent frames, inputs maps names to arrays with a leading batch dimension.
+    Recurrent inputs (e.g. features_buffer) are not fed back between frames of the same batch."""
+    batch_size = len(next(iter(inputs.values())))
+    assert all(len(v) == batch_size for v in inputs.values()), "All inputs must have the same batch size"
+
+    if self.dynamic_batch:
+      outputs = self.session.run(None, self.prepare_inputs(inputs, batch_size))
+      assert len(outputs) == 1, "Only single model outputs are supported"
+      return outputs[0].reshape(batch_size, -1)
+
+    # model was exported with a fixed batch size of 1, run frame by frame
+    output = []
+    for i in range(batch_size):
+      outputs = self.session.run(None, self.prepare_inputs({k: v[i] for k,v in inputs.items()}))
+      assert len(outputs) == 1, "Only single model outputs are supported"
+      output.append(outputs[0].reshape(-1))
+    return np.stack(output)
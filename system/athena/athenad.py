@@ -2,7 +2,7 @@
 from __future__ import annotations
 
 import base64
-import bz2
+import bisect
 import hashlib
 import io
 import json
@@ -15,11 +15,12 @@ import sys
 import tempfile
 import threading
 import time
+import zlib
 from dataclasses import asdict, dataclass, replace
 from datetime import datetime
 from functools import partial
 from queue import Queue
-from typing import cast
+from typing import BinaryIO, cast
 from collections.abc import Callable
 
 import requests
@@ -31,11 +32,12 @@ import cereal.messaging as messaging
 from cereal import log
 from cereal.services import SERVICE_LIST
 from openpilot.common.api import Api
-from openpilot.common.file_helpers import CallbackReader
+from openpilot.common.file_helpers import Bz2CompressingReader, CallbackReader, atomic_write_in_dir
+from openpilot.common.inotify import Inotify, IN_CLOSE_WRITE, IN_CREATE, IN_DELETE, IN_MOVED_FROM, IN_MOVED_TO, IN_Q_OVERFLOW
 from openpilot.common.params import Params
 from openpilot.common.realtime import set_core_affinity
 from openpilot.system.hardware import HARDWARE, PC
-from openpilot.system.loggerd.xattr_cache import getxattr, setxattr
+from openpilot.system.loggerd.xattr_cache import getxattr_dir, setxattr
 from openpilot.common.swaglog import cloudlog
 from openpilot.system.version import get_build_metadata
 from openpilot.system.hardware.hw import Paths
@@ -53,6 +55,16 @@ RETRY_DELAY = 10  # seconds
 MAX_RETRY_COUNT = 30  # Try for at most 5 minutes if upload fails immediately
 MAX_AGE = 31 * 24 * 3600  # seconds
 WS_FRAME_SIZE = 4096
+UPLOAD_CHUNK_SIZE = 4 * 1024 * 1024  # block size of resumable uploads
+JOURNAL_COMPACT_RECORDS = 1000  # rewrite the upload journal after this many appended records
+
+LOG_WINDOW = int(os.getenv('ATHENA_LOG_WINDOW', "4"))  # forwardLogs requests in flight
+LOG_BATCH_MAX_BYTES = int(os.getenv('ATHENA_LOG_BATCH_BYTES', str(1024 * 1024)))
+LOG_COMPRESSION = os.getenv('ATHENA_LOG_COMPRESSION') is not None  # zlib + base64 encoded logs, needs server support
+LOG_RESPONSE_TIMEOUT = 100  # seconds
+LOG_RESCAN_INTERVAL = 10  # seconds, only used without inotify
+STATS_SCAN_INTERVAL = 10  # seconds
+STATS_BATCH_MAX_BYTES = 512 * 1024
 
 NetworkType = log.DeviceState.NetworkType
 
@@ -85,11 +97,12 @@ class UploadItem:
   current: bool = False
   progress: float = 0
   allow_cellular: bool = False
+  offset: int = 0  # bytes acknowledged by the server for resumable uploads
 
   @classmethod
   def from_dict(cls, d: dict) -> UploadItem:
     return cls(d["path"], d["url"], d["headers"], d["created_at"], d["id"], d["retry_count"], d["current"],
-               d["progress"], d["allow_cellular"])
+               d["progress"], d["allow_cellular"], d.get("offset", 0))
 
 
 dispatcher["echo"] = lambda s: s
@@ -114,25 +127,98 @@ class AbortTransferException(Exception):
 
 
 class UploadQueueCache:
+  """Append-only journal of the upload queue, one JSON record per line.
+  Records add or update an item, store the acknowledged offset of a resumable upload, or remove an item.
+  The journal is replayed and compacted on startup, and compacted again once it grows too long."""
+  lock = threading.Lock()
+  items: dict[str, UploadItemDict] = {}
+  records = 0
 
   @staticmethod
-  def initialize(upload_queue: Queue[UploadItem]) -> None:
+  def path() -> str:
+    # next to the log root, so it's on the same persistent partition but not listed as log data
+    return os.path.join(os.path.dirname(os.path.normpath(Paths.log_root())), "athena_upload_journal")
+
+  @classmethod
+  def initialize(cls, upload_queue: Queue[UploadItem]) -> None:
     try:
-      upload_queue_json = Params().get("AthenadUploadQueue")
-      if upload_queue_json is not None:
-        for item in json.loads(upload_queue_json):
-          upload_queue.put(UploadItem.from_dict(item))
+      with cls.lock:
+        cls.items = {}
+        try:
+          with open(cls.path()) as f:
+            for line in f:
+              try:
+                cls._apply(json.loads(line))
+              except (ValueError, KeyError):
+                # last record can be torn if athenad was killed while writing it
+                cloudlog.event("athena.UploadQueueCache.initialize.bad_record", line=line)
+        except FileNotFoundError:
+          pass
+
+        # migrate the queue from the old param based cache
+        params = Params()
+        upload_queue_json = params.get("AthenadUploadQueue")
+        if upload_queue_json is not None:
+          for item in json.loads(upload_queue_json):
+            cls.items.setdefault(item["id"], item)
+          params.remove("AthenadUploadQueue")
+
+        cls._compact()
+
+      for item in cls.items.values():
+        upload_queue.put(replace(UploadItem.from_dict(item), current=False))
     except Exception:
       cloudlog.exception("athena.UploadQueueCache.initialize.exception")
 
-  @staticmethod
-  def cache(upload_queue: Queue[UploadItem]) -> None:
+  @classmethod
+  def _apply(cls, record: dict) -> None:
+    if "put" in record:
+      cls.items[record["put"]["id"]] = record["put"]
+    elif "offset" in record:
+      if record["id"] in cls.items:
+        cls.items[record["id"]]["offset"] = record["offset"]
+    elif "remove" in record:
+      cls.items.pop(record["remove"], None)
+
+  @classmethod
+  def _compact(cls) -> None:
+    path = cls.path()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with atomic_write_in_dir(path, overwrite=True) as f:
+      for item in cls.items.values():
+        f.write(json.dumps({"put": item}) + "\n")
+    cls.records = len(cls.items)
+
+  @classmethod
+  def _append(cls, record: dict) -> None:
     try:
-      queue: list[UploadItem | None] = list(upload_queue.queue)
-      items = [asdict(i) for i in queue if i is not None and (i.id not in cancelled_uploads)]
-      Params().put("AthenadUploadQueue", json.dumps(items))
+      with cls.lock:
+        cls._apply(record)
+        if cls.records >= JOURNAL_COMPACT_RECORDS:
+          cls._compact()
+        else:
+          with open(cls.path(), "a") as f:
+            f.write(json.dumps(record) + "\n")
+          cls.records += 1
     except Exception:
-      cloudlog.exception("athena.UploadQueueCache.cache.exception")
+      cloudlog.exception("athena.UploadQueueCache.append.exception")
+
+  @classmethod
+  def put(cls, item: UploadItem) -> None:
+    cls._append({"put": asdict(item)})
+
+  @classmethod
+  def set_offset(cls, upload_id: str, offset: int) -> None:
+    cls._append({"id": upload_id, "offset": offset})
+
+  @classmethod
+  def get_offset(cls, upload_id: str) -> int:
+    with cls.lock:
+      return int(cls.items.get(upload_id, {}).get("offset", 0))
+
+  @classmethod
+  def remove(cls, upload_id: str) -> None:
+    cls._append({"remove": upload_id})
 
 
 def handle_long_poll(ws: WebSocket, exit_event: threading.Event | None) -> None:
@@ -194,10 +280,11 @@ def retry_upload(tid: int, end_event: threading.Event, increase_count: bool = Tr
       item,
       retry_count=new_retry_count,
       progress=0,
-      current=False
+      current=False,
+      offset=UploadQueueCache.get_offset(item.id),
     )
     upload_queue.put_nowait(item)
-    UploadQueueCache.cache(upload_queue)
+    UploadQueueCache.put(item)
 
     cur_upload_items[tid] = None
 
@@ -205,6 +292,9 @@ def retry_upload(tid: int, end_event: threading.Event, increase_count: bool = Tr
       time.sleep(1)
       if end_event.is_set():
         break
+  elif item is not None:
+    cloudlog.event("athena.upload_handler.max_retries", item=item, error=True)
+    UploadQueueCache.remove(item.id)
 
 
 def cb(sm, item, tid, end_event: threading.Event, sz: int, cur: int) -> None:
@@ -239,6 +329,7 @@ def upload_handler(end_event: threading.Event) -> None:
       age = datetime.now() - datetime.fromtimestamp(item.created_at / 1000)
       if age.total_seconds() > MAX_AGE:
         cloudlog.event("athena.upload_handler.expired", item=item, error=True)
+        UploadQueueCache.remove(item.id)
         continue
 
       # Check if uploading over metered connection is allowed
@@ -264,8 +355,7 @@ def upload_handler(end_event: threading.Event) -> None:
           retry_upload(tid, end_event)
         else:
           cloudlog.event("athena.upload_handler.success", fn=fn, sz=sz, network_type=network_type, metered=metered)
-
-        UploadQueueCache.cache(upload_queue)
+          UploadQueueCache.remove(item.id)
       except (requests.exceptions.Timeout, requests.exceptions.ConnectionError, requests.exceptions.SSLError):
         cloudlog.event("athena.upload_handler.timeout", fn=fn, sz=sz, network_type=network_type, metered=metered)
         retry_upload(tid, end_event)
@@ -277,6 +367,9 @@ def upload_handler(end_event: threading.Event) -> None:
       pass
     except Exception:
       cloudlog.exception("athena.upload_handler.exception")
+      # the item is dropped, so it must not be replayed from the journal either
+      if cur_upload_items[tid] is not None:
+        UploadQueueCache.remove(cur_upload_items[tid].id)
 
 
 def _do_upload(upload_item: UploadItem, callback: Callable = None) -> requests.Response:
@@ -289,18 +382,78 @@ def _do_upload(upload_item: UploadItem, callback: Callable = None) -> requests.R
     compress = True
 
   with open(path, "rb") as f:
-    content = f.read()
+    data: BinaryIO | Bz2CompressingReader
     if compress:
       cloudlog.event("athena.upload_handler.compress", fn=path, fn_orig=upload_item.path)
-      content = bz2.compress(content)
+      data = Bz2CompressingReader(f)
+      size = data.len
+    else:
+      data = f
+      size = os.fstat(f.fileno()).st_size
+
+    # files that fit in one block gain nothing from resuming, they're sent with a single PUT
+    if upload_item.headers.get("x-ms-blob-type") == "BlockBlob" and size > UPLOAD_CHUNK_SIZE:
+      return _do_block_upload(upload_item, data, size, callback)
 
-  with io.BytesIO(content) as data:
     return requests.put(upload_item.url,
-                        data=CallbackReader(data, callback, len(content)) if callback else data,
-                        headers={**upload_item.headers, 'Content-Length': str(len(content))},
+                        data=CallbackReader(data, callback, size) if callback else data,
+                        headers={**upload_item.headers, 'Content-Length': str(size)},
                         timeout=30)
 
 
+def get_block_id(index: int) -> str:
+  # all block ids of a blob need to have the same length
+  return base64.b64encode(f"{index:08d}".encode()).decode()
+
+
+def _do_block_upload(upload_item: UploadItem, data: BinaryIO | Bz2CompressingReader, size: int,
+                     callback: Callable = None) -> requests.Response:
+  """Uploads in UPLOAD_CHUNK_SIZE blocks (Put Block), then commits them (Put Block List).
+  The acknowledged offset is journaled after every block, so a retry continues from the last acknowledged block."""
+  offset = upload_item.offset
+  if offset > size or offset % UPLOAD_CHUNK_SIZE != 0:
+    offset = 0
+
+  # skip data that was already uploaded, compressed data has to be regenerated to get there
+  if isinstance(data, Bz2CompressingReader):
+    skipped = 0
+    while skipped < offset:
+      skipped += len(data.read(min(UPLOAD_CHUNK_SIZE, offset - skipped)))
+  else:
+    data.seek(offset)
+
+  headers = {k: v for k, v in upload_item.headers.items() if k.lower() != "x-ms-blob-type"}
+  with requests.Session() as session:
+    while offset < size:
+      chunk = data.read(UPLOAD_CHUNK_SIZE)
+      if not chunk:
+        break
+
+      chunk_offset = offset
+      body = io.BytesIO(chunk)
+      response = session.put(upload_item.url,
+                             params={"comp": "block", "blockid": get_block_id(offset // UPLOAD_CHUNK_SIZE)},
+                             data=CallbackReader(body, lambda cur: callback(size, chunk_offset + cur)) if callback else body,
+                             headers={**headers, 'Content-Length': str(len(chunk))},
+                             timeout=30)
+      if response.status_code not in (200, 201):
+        return response
+
+      offset += len(chunk)
+      UploadQueueCache.set_offset(upload_item.id, offset)
+
+    block_list = "".join(f"<Latest>{get_block_id(i)}</Latest>" for i in range((offset + UPLOAD_CHUNK_SIZE - 1) // UPLOAD_CHUNK_SIZE))
+    response = session.put(upload_item.url,
+                           params={"comp": "blocklist"},
+                           data=f'<?xml version="1.0" encoding="utf-8"?><BlockList>{block_list}</BlockList>',
+                           headers=headers,
+                           timeout=30)
+    if response.status_code == 400:
+      # uncommitted blocks expired or were discarded by the server, start over on the next retry
+      UploadQueueCache.set_offset(upload_item.id, 0)
+    return response
+
+
 # security: user should be able to request any message from their car
 @dispatcher.add_method
 def getMessage(service: str, timeout: int = 1000) -> dict:
@@ -408,10 +561,9 @@ def uploadFilesToUrls(files_data: list[UploadFileDict]) -> UploadFilesToUrlRespo
     upload_id = hashlib.sha1(str(item).encode()).hexdigest()
     item = replace(item, id=upload_id)
     upload_queue.put_nowait(item)
+    UploadQueueCache.put(item)
     items.append(asdict(item))
 
-  UploadQueueCache.cache(upload_queue)
-
   resp: UploadFilesToUrlResponse = {"enqueued": len(items), "items": items}
   if failed:
     resp["failed"] = failed
@@ -436,6 +588,8 @@ def cancelUpload(upload_id: str | list[str]) -> dict[str, int | str]:
     return {"success": 0, "error": "not found"}
 
   cancelled_uploads.update(cancelled_ids)
+  for cancelled_id in cancelled_ids:
+    UploadQueueCache.remove(cancelled_id)
   return {"success": 1}
 
 @dispatcher.add_method
@@ -549,15 +703,12 @@ def takeSnapshot() -> str | dict[str, str] | None:
     raise Exception("not available while camerad is started")
 
 
-def get_logs_to_send_sorted() -> list[str]:
-  # TODO: scan once then use inotify to detect file creation/deletion
+def get_unsent_logs_sorted() -> list[str]:
   curr_time = int(time.time())
   logs = []
-  for log_entry in os.listdir(Paths.swaglog_root()):
-    log_path = os.path.join(Paths.swaglog_root(), log_entry)
+  for log_entry, value in getxattr_dir(Paths.swaglog_root(), LOG_ATTR_NAME).items():
     time_sent = 0
     try:
-      value = getxattr(log_path, LOG_ATTR_NAME)
       if value is not None:
         time_sent = int.from_bytes(value, sys.byteorder)
     except (ValueError, TypeError):
@@ -565,97 +716,236 @@ def get_logs_to_send_sorted() -> list[str]:
     # assume send failed and we lost the response if sent more than one hour ago
     if not time_sent or curr_time - time_sent > 3600:
       logs.append(log_entry)
+  return sorted(logs)
+
+
+def get_logs_to_send_sorted() -> list[str]:
   # excluding most recent (active) log file
-  return sorted(logs)[:-1]
+  return get_unsent_logs_sorted()[:-1]
+
+
+class PendingLogIndex:
+  """Swaglog files that still need to be forwarded, sorted by name (oldest first).
+  The directory is scanned once, after that new and removed files are picked up from inotify.
+  Without inotify the directory is rescanned every LOG_RESCAN_INTERVAL seconds."""
+  def __init__(self, log_root: str):
+    self.log_root = log_root
+    self.pending: list[str] = []
+    self.retry: dict[str, float] = {}  # sent without a successful response, name -> time to send again
+    self.last_scan = 0.
+    self.inotify = Inotify() if Inotify.available() else None
+    self.watching = False
+
+  def rescan(self) -> None:
+    if self.inotify is not None and not self.watching:
+      try:
+        self.inotify.add_watch(self.log_root, IN_CREATE | IN_MOVED_TO | IN_DELETE | IN_MOVED_FROM)
+        self.watching = True
+      except OSError:
+        cloudlog.exception("athena.log_handler.add_watch_failed")
+
+    # includes the active log, pop_batch skips the newest file
+    self.pending = get_unsent_logs_sorted()
+    self.retry = {}
+    self.last_scan = time.monotonic()
+
+  def update(self) -> None:
+    if not self.watching:
+      if time.monotonic() - self.last_scan > LOG_RESCAN_INTERVAL:
+        self.rescan()
+    else:
+      for event in self.inotify.read():
+        if event.mask & IN_Q_OVERFLOW:
+          self.rescan()
+          break
+        if event.mask & (IN_CREATE | IN_MOVED_TO):
+          if event.name not in self.pending:
+            bisect.insort(self.pending, event.name)
+        elif event.mask & (IN_DELETE | IN_MOVED_FROM):
+          self.discard(event.name)
+          self.retry.pop(event.name, None)
+
+    now = time.monotonic()
+    for name, retry_time in list(self.retry.items()):
+      if now > retry_time:
+        del self.retry[name]
+        bisect.insort(self.pending, name)
+
+  def discard(self, name: str) -> None:
+    idx = bisect.bisect_left(self.pending, name)
+    if idx < len(self.pending) and self.pending[idx] == name:
+      del self.pending[idx]
+
+  def pop_batch(self, max_bytes: int) -> list[str]:
+    """Newest logs first, up to max_bytes in total. The most recent (active) log file is never returned."""
+    batch: list[str] = []
+    size = 0
+    while len(self.pending) > 1 and size < max_bytes:
+      log_entry = self.pending[-2]
+      try:
+        log_size = os.path.getsize(os.path.join(self.log_root, log_entry))
+      except OSError:
+        del self.pending[-2]  # file could be deleted by log rotation
+        continue
+      if batch and size + log_size > max_bytes:
+        break
+      del self.pending[-2]
+      batch.append(log_entry)
+      size += log_size
+    return batch
+
+  def close(self) -> None:
+    if self.inotify is not None:
+      self.inotify.close()
+
+  def retry_later(self, names: list[str]) -> None:
+    # assume send failed and we lost the response, same as the one hour timeout of get_logs_to_send_sorted
+    for name in names:
+      self.retry[name] = time.monotonic() + 3600
 
 
 def log_handler(end_event: threading.Event) -> None:
   if PC:
     return
 
-  log_files = []
-  last_scan = 0.
+  log_root = Paths.swaglog_root()
+  index = PendingLogIndex(log_root)
+  in_flight: dict[str, float] = {}  # request id -> send time
+
   while not end_event.is_set():
     try:
-      curr_scan = time.monotonic()
-      if curr_scan - last_scan > 10:
-        log_files = get_logs_to_send_sorted()
-        last_scan = curr_scan
+      index.update()
 
-      # send one log
-      curr_log = None
-      if len(log_files) > 0:
-        log_entry = log_files.pop() # newest log file
-        cloudlog.debug(f"athena.log_handler.forward_request {log_entry}")
-        try:
-          curr_time = int(time.time())
-          log_path = os.path.join(Paths.swaglog_root(), log_entry)
-          setxattr(log_path, LOG_ATTR_NAME, int.to_bytes(curr_time, 4, sys.byteorder))
-          with open(log_path) as f:
-            jsonrpc = {
-              "method": "forwardLogs",
-              "params": {
-                "logs": f.read()
-              },
-              "jsonrpc": "2.0",
-              "id": log_entry
-            }
-            low_priority_send_queue.put_nowait(json.dumps(jsonrpc))
-            curr_log = log_entry
-        except OSError:
-          pass  # file could be deleted by log rotation
+      # keep up to LOG_WINDOW requests in flight
+      while len(in_flight) < LOG_WINDOW:
+        batch = index.pop_batch(LOG_BATCH_MAX_BYTES)
+        if not batch:
+          break
+
+        curr_time = int(time.time())
+        logs, sent = [], []
+        for log_entry in batch:
+          log_path = os.path.join(log_root, log_entry)
+          try:
+            setxattr(log_path, LOG_ATTR_NAME, int.to_bytes(curr_time, 4, sys.byteorder))
+            with open(log_path) as f:
+              content = f.read()
+          except OSError:
+            continue  # file could be deleted by log rotation
+          logs.append(content if content.endswith("\n") or not content else content + "\n")
+          sent.append(log_entry)
+        if not sent:
+          continue
+
+        # a single log keeps its name as id, batches join all names
+        log_id = ",".join(sent)
+        cloudlog.debug(f"athena.log_handler.forward_request {log_id}")
+        params: dict[str, str] = {"logs": "".join(logs)}
+        if LOG_COMPRESSION:
+          params = {"logs": base64.b64encode(zlib.compress(params["logs"].encode())).decode(), "compression": "zlib"}
+        jsonrpc = {
+          "method": "forwardLogs",
+          "params": params,
+          "jsonrpc": "2.0",
+          "id": log_id
+        }
+        low_priority_send_queue.put_nowait(json.dumps(jsonrpc))
+        in_flight[log_id] = time.monotonic()
 
-      # wait for response up to ~100 seconds
       # always read queue at least once to process any old responses that arrive
-      for _ in range(100):
-        if end_event.is_set():
-          break
-        try:
-          log_resp = json.loads(log_recv_queue.get(timeout=1))
-          log_entry = log_resp.get("id")
-          log_success = "result" in log_resp and log_resp["result"].get("success")
-          cloudlog.debug(f"athena.log_handler.forward_response {log_entry} {log_success}")
-          if log_entry and log_success:
-            log_path = os.path.join(Paths.swaglog_root(), log_entry)
-            try:
-              setxattr(log_path, LOG_ATTR_NAME, LOG_ATTR_VALUE_MAX_UNIX_TIME)
-            except OSError:
-              pass  # file could be deleted by log rotation
-          if curr_log == log_entry:
-            break
-        except queue.Empty:
-          if curr_log is None:
-            break
+      try:
+        log_resp = json.loads(log_recv_queue.get(timeout=1))
+        log_id = log_resp.get("id")
+        log_success = "result" in log_resp and log_resp["result"].get("success")
+        cloudlog.debug(f"athena.log_handler.forward_response {log_id} {log_success}")
+        if log_id:
+          in_flight.pop(log_id, None)
+          if log_success:
+            for log_entry in log_id.split(","):
+              try:
+                setxattr(os.path.join(log_root, log_entry), LOG_ATTR_NAME, LOG_ATTR_VALUE_MAX_UNIX_TIME)
+              except OSError:
+                pass  # file could be deleted by log rotation
+          else:
+            index.retry_later(log_id.split(","))
+      except queue.Empty:
+        pass
+
+      # give up waiting for responses after LOG_RESPONSE_TIMEOUT
+      now = time.monotonic()
+      for log_id, sent_time in list(in_flight.items()):
+        if now - sent_time > LOG_RESPONSE_TIMEOUT:
+          del in_flight[log_id]
+          index.retry_later(log_id.split(","))
 
     except Exception:
       cloudlog.exception("athena.log_handler.exception")
 
+  index.close()
+
 
 def stat_handler(end_event: threading.Event) -> None:
   STATS_DIR = Paths.stats_root()
+  inotify = Inotify() if Inotify.available() else None
+  watching = False
+  last_scan = 0.
+  woken = False
+  backlog = False
+
   while not end_event.is_set():
-    last_scan = 0.
     curr_scan = time.monotonic()
     try:
-      if curr_scan - last_scan > 10:
-        stat_filenames = list(filter(lambda name: not name.startswith(tempfile.gettempprefix()), os.listdir(STATS_DIR)))
-        if len(stat_filenames) > 0:
-          stat_path = os.path.join(STATS_DIR, stat_filenames[0])
-          with open(stat_path) as f:
-            jsonrpc = {
-              "method": "storeStats",
-              "params": {
-                "stats": f.read()
-              },
-              "jsonrpc": "2.0",
-              "id": stat_filenames[0]
-            }
-            low_priority_send_queue.put_nowait(json.dumps(jsonrpc))
-          os.remove(stat_path)
+      if inotify is not None and not watching:
+        try:
+          inotify.add_watch(STATS_DIR, IN_MOVED_TO | IN_CLOSE_WRITE)
+          watching = True
+        except OSError:
+          pass  # statsd creates the directory
+
+      if woken or backlog or curr_scan - last_scan > STATS_SCAN_INTERVAL:
+        stat_filenames = sorted(filter(lambda name: not name.startswith(tempfile.gettempprefix()), os.listdir(STATS_DIR)))
+
+        # ship several stat files per request, they are InfluxDB lines so they can be concatenated
+        stats, sent, size = [], [], 0
+        for stat_filename in stat_filenames:
+          stat_path = os.path.join(STATS_DIR, stat_filename)
+          try:
+            with open(stat_path) as f:
+              content = f.read()
+          except OSError:
+            continue
+          if sent and size + len(content) > STATS_BATCH_MAX_BYTES:
+            break
+          stats.append(content if content.endswith("\n") or not content else content + "\n")
+          sent.append(stat_path)
+          size += len(content)
+
+        if len(sent) > 0:
+          jsonrpc = {
+            "method": "storeStats",
+            "params": {
+              "stats": "".join(stats)
+            },
+            "jsonrpc": "2.0",
+            "id": os.path.basename(sent[0])
+          }
+          low_priority_send_queue.put_nowait(json.dumps(jsonrpc))
+          for stat_path in sent:
+            os.remove(stat_path)
+        backlog = len(sent) < len(stat_filenames)
         last_scan = curr_scan
     except Exception:
       cloudlog.exception("athena.stat_handler.exception")
-    time.sleep(0.1)
+      backlog = False
+
+    # wake up as soon as statsd writes a new file
+    if watching and not backlog:
+      woken = len(inotify.read(timeout=1.)) > 0
+    else:
+      time.sleep(0.1)
+
+  if inotify is not None:
+    inotify.close()
 
 
 def ws_proxy_recv(ws: WebSocket, local_sock: socket.socket, ssock: socket.socket, end_event: threading.Event, global_end_event: threading.Event) -> None:
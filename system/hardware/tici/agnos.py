@@ -3,8 +3,10 @@ import hashlib
 import json
 import lzma
 import os
+import queue
 import struct
 import subprocess
+import threading
 import time
 from collections.abc import Generator
 
@@ -17,31 +19,61 @@ CAIBX_URL = "https://commadist.azureedge.net/agnosupdate/"
 
 AGNOS_MANIFEST_FILE = "system/hardware/tici/agnos.json"
 
+READ_CHUNK_SIZE = 1024 * 1024  # size of the pieces that are decompressed, yielded and written
+WRITE_QUEUE_SIZE = 16  # pieces buffered between decompression and the writer thread
+
 
 class StreamingDecompressor:
   def __init__(self, url: str) -> None:
-    self.buf = b""
-
-    self.req = requests.get(url, stream=True, headers={'Accept-Encoding': None}, timeout=60)
-    self.it = self.req.iter_content(chunk_size=1024 * 1024)
+    # decompressed data, everything before pos has been read already
+    self.buf = bytearray()
+    self.pos = 0
+
+    if os.path.isfile(url):
+      self.req = None
+      self.f = open(url, 'rb')
+      self.it = iter(lambda: self.f.read(1024 * 1024), b"")
+    else:
+      self.req = requests.get(url, stream=True, headers={'Accept-Encoding': None}, timeout=60)
+      self.it = self.req.iter_content(chunk_size=1024 * 1024)
     self.decompressor = lzma.LZMADecompressor(format=lzma.FORMAT_AUTO)
     self.eof = False
     self.sha256 = hashlib.sha256()
 
   def read(self, length: int) -> bytes:
-    while len(self.buf) < length:
-      self.req.raise_for_status()
+    while len(self.buf) - self.pos < length:
+      if self.req is not None:
+        self.req.raise_for_status()
 
-      try:
-        compressed = next(self.it)
-      except StopIteration:
+      if self.decompressor.eof:
         self.eof = True
         break
-      out = self.decompressor.decompress(compressed)
-      self.buf += out
 
-    result = self.buf[:length]
-    self.buf = self.buf[length:]
+      if self.decompressor.needs_input:
+        try:
+          compressed = next(self.it)
+        except StopIteration:
+          self.eof = True
+          break
+      else:
+        compressed = b""
+
+      # only decompress what's needed, so the buffer stays bounded by the read size
+      needed = length - (len(self.buf) - self.pos)
+      self.buf += self.decompressor.decompress(compressed, max_length=max(needed, READ_CHUNK_SIZE))
+
+    end = min(self.pos + length, len(self.buf))
+    with memoryview(self.buf) as view:
+      result = bytes(view[self.pos:end])
+    self.pos = end
+
+    # drop data that has been read, at most once per buffer length so reads stay linear
+    if self.pos == len(self.buf):
+      self.buf.clear()
+      self.pos = 0
+    elif self.pos > len(self.buf) // 2:
+      del self.buf[:self.pos]
+      self.pos = 0
 
     self.sha256.update(result)
     return result
@@ -68,13 +100,17 @@ def unsparsify(f: StreamingDecompressor) -> Generator[bytes, None, None]:
   for _ in range(num_chunks):
     chunk_type, out_blocks = SPARSE_CHUNK_FMT.unpack(f.read(12))
 
+    # yield whole blocks, in pieces of about READ_CHUNK_SIZE. Largest observed data chunk is 252 MB.
+    blocks_per_piece = max(READ_CHUNK_SIZE // block_sz, 1)
     if chunk_type == 0xcac1:  # Raw
-      # TODO: yield in smaller chunks. Yielding only block_sz is too slow. Largest observed data chunk is 252 MB.
-      yield f.read(out_blocks * block_sz)
+      for i in range(0, out_blocks, blocks_per_piece):
+        yield f.read(min(blocks_per_piece, out_blocks - i) * block_sz)
     elif chunk_type == 0xcac2:  # Fill
       filler = f.read(4) * (block_sz // 4)
-      for _ in range(out_blocks):
-        yield filler
+      piece = filler * min(blocks_per_piece, out_blocks)
+      for i in range(0, out_blocks, blocks_per_piece):
+        n = min(blocks_per_piece, out_blocks - i)
+        yield piece if n == blocks_per_piece else filler * n
     elif chunk_type == 0xcac3:  # Don't care
       yield b""
     else:
@@ -84,7 +120,7 @@ def unsparsify(f: StreamingDecompressor) -> Generator[bytes, None, None]:
 # noop wrapper with same API as unsparsify() for non sparse images
 def noop(f: StreamingDecompressor) -> Generator[bytes, None, None]:
   while not f.eof:
-    yield f.read(1024 * 1024)
+    yield f.read(READ_CHUNK_SIZE)
 
 
 def get_target_slot_number() -> int:
@@ -151,22 +187,52 @@ def clear_partition_hash(target_slot_number: int, partition: dict) -> None:
     os.sync()
 
 
+def write_chunks(out, chunks: Generator[bytes, None, None], partition: dict):
+  """Writes chunks to out and returns their sha256. Hashing and writing run in a thread
+  so they overlap with the download and decompression producing the chunks."""
+  raw_hash = hashlib.sha256()
+  q: queue.Queue[bytes | None] = queue.Queue(maxsize=WRITE_QUEUE_SIZE)
+  errors: list[Exception] = []
+
+  def writer():
+    last_p = 0
+    while (chunk := q.get()) is not None:
+      if errors:
+        continue  # keep draining so the producer doesn't block
+      try:
+        raw_hash.update(chunk)
+        out.write(chunk)
+        p = int(out.tell() / partition['size'] * 100)
+        if p != last_p:
+          last_p = p
+          print(f"Installing {partition['name']}: {p}", flush=True)
+      except Exception as e:
+        errors.append(e)
+
+  t = threading.Thread(target=writer)
+  t.start()
+  try:
+    for chunk in chunks:
+      if errors:
+        break
+      q.put(chunk)
+  finally:
+    q.put(None)
+    t.join()
+
+  if errors:
+    raise errors[0]
+  return raw_hash
+
+
 def extract_compressed_image(target_slot_number: int, partition: dict, cloudlog):
   path = get_partition_path(target_slot_number, partition)
   downloader = StreamingDecompressor(partition['url'])
 
   with open(path, 'wb+') as out:
     # Flash partition
-    last_p = 0
-    raw_hash = hashlib.sha256()
     f = unsparsify if partition['sparse'] else noop
-    for chunk in f(downloader):
-      raw_hash.update(chunk)
-      out.write(chunk)
-      p = int(out.tell() / partition['size'] * 100)
-      if p != last_p:
-        last_p = p
-        print(f"Installing {partition['name']}: {p}", flush=True)
+    raw_hash = write_chunks(out, f(downloader), partition)
 
     if raw_hash.hexdigest().lower() != partition['hash_raw'].lower():
       raise Exception(f"Raw hash mismatch '{raw_hash.hexdigest().lower()}'")
@@ -28,6 +28,15 @@ def get_available_bytes(default=None):
 
   return available_bytes
 
+def get_total_bytes(default=None):
+  try:
+    statvfs = os.statvfs(Paths.log_root())
+    total_bytes = statvfs.f_blocks * statvfs.f_frsize
+  except OSError:
+    total_bytes = default
+
+  return total_bytes
+
 def get_used_bytes(default=None):
   try:
     statvfs = os.statvfs(Paths.log_root())
@@ -1,12 +1,12 @@
 #!/usr/bin/env python3
 import os
-import shutil
 import threading
 from openpilot.system.hardware.hw import Paths
 from openpilot.common.swaglog import cloudlog
-from openpilot.system.loggerd.config import get_available_bytes, get_available_percent
+from openpilot.common.token_bucket import TokenBucket
+from openpilot.system.loggerd.config import get_available_bytes, get_available_percent, get_total_bytes
 from openpilot.system.loggerd.uploader import listdir_by_creation
-from openpilot.system.loggerd.xattr_cache import getxattr
+from openpilot.system.loggerd.xattr_cache import getxattr, invalidate
 
 MIN_BYTES = 5 * 1024 * 1024 * 1024
 MIN_PERCENT = 10
@@ -17,6 +17,11 @@ PRESERVE_ATTR_NAME = 'user.preserve'
 PRESERVE_ATTR_VALUE = b'1'
 PRESERVE_COUNT = 5
 
+# unlinks per second, so a directory with many small files doesn't starve loggerd's writes, 0 is unlimited
+# a segment is about 7 unlinks, so 200/s still deletes ~28 segments per second, more than the
+# one directory per 0.1 s loop before the limit, and a full second's worth can be deleted at once
+DELETE_RATE = float(os.getenv("DELETER_RATE", "200"))
+
 
 def has_preserve_xattr(d: str) -> bool:
   return getxattr(os.path.join(Paths.log_root(), d), PRESERVE_ATTR_NAME) == PRESERVE_ATTR_VALUE
@@ -44,33 +49,89 @@ def get_preserved_segments(dirs_by_creation: list[str]) -> list[str]:
   return preserved
 
 
-def deleter_thread(exit_event):
+def get_bytes_to_free(available_bytes: int, available_percent: float) -> int:
+  """Bytes that need to be deleted to be above both MIN_BYTES and MIN_PERCENT"""
+  total_bytes = get_total_bytes(default=0)
+  return max(MIN_BYTES - available_bytes, int(total_bytes * (MIN_PERCENT - available_percent) / 100), 0)
+
+
+def get_dir_usage(path: str) -> int | None:
+  """Disk usage of the files in a log directory, None if it's locked"""
+  if os.path.isfile(path):
+    return os.lstat(path).st_blocks * 512
+
+  usage = 0
+  for root, _, filenames in os.walk(path):
+    for name in filenames:
+      if name.endswith(".lock"):
+        return None
+      usage += os.lstat(os.path.join(root, name)).st_blocks * 512
+  return usage
+
+
+def get_dirs_to_delete(dirs_by_creation: list[str], bytes_to_free: int) -> list[str]:
+  """The earliest directories that free bytes_to_free when deleted, at least one if any can be deleted"""
+  # skip deleting most recent N preserved segments (and their prior segment)
+  preserved_dirs = get_preserved_segments(dirs_by_creation)
+
+  dirs = []
+  for delete_dir in sorted(dirs_by_creation, key=lambda d: (d in DELETE_LAST, d in preserved_dirs)):
+    if len(dirs) and bytes_to_free <= 0:
+      break
+
+    try:
+      usage = get_dir_usage(os.path.join(Paths.log_root(), delete_dir))
+    except OSError:
+      cloudlog.exception(f"issue reading {delete_dir}")
+      continue
+
+    if usage is not None:
+      dirs.append(delete_dir)
+      bytes_to_free -= usage
+  return dirs
+
+
+def delete_path(path: str, unlinks: TokenBucket, exit_event: threading.Event) -> None:
+  """Deletes a file or directory one entry at a time within the unlink rate limit"""
+  if os.path.isfile(path):
+    unlinks.consume(1, exit_event.wait)
+    os.remove(path)
+    return
+
+  for root, dirnames, filenames in os.walk(path, topdown=False):
+    for name in filenames:
+      unlinks.consume(1, exit_event.wait)
+      os.remove(os.path.join(root, name))
+    for name in dirnames:
+      unlinks.consume(1, exit_event.wait)
+      os.rmdir(os.path.join(root, name))
+  unlinks.consume(1, exit_event.wait)
+  os.rmdir(path)
+
+
+def deleter_thread(exit_event: threading.Event):
+  unlinks = TokenBucket(DELETE_RATE)
   while not exit_event.is_set():
-    out_of_bytes = get_available_bytes(default=MIN_BYTES + 1) < MIN_BYTES
-    out_of_percent = get_available_percent(default=MIN_PERCENT + 1) < MIN_PERCENT
+    available_bytes = get_available_bytes(default=MIN_BYTES + 1)
+    available_percent = get_available_percent(default=MIN_PERCENT + 1)
+    out_of_bytes = available_bytes < MIN_BYTES
+    out_of_percent = available_percent < MIN_PERCENT
 
     if out_of_percent or out_of_bytes:
       dirs = listdir_by_creation(Paths.log_root())
 
-      # skip deleting most recent N preserved segments (and their prior segment)
-      preserved_dirs = get_preserved_segments(dirs)
-
-      # remove the earliest directory we can
-      for delete_dir in sorted(dirs, key=lambda d: (d in DELETE_LAST, d in preserved_dirs)):
-        delete_path = os.path.join(Paths.log_root(), delete_dir)
-
-        if any(name.endswith(".lock") for name in os.listdir(delete_path)):
-          continue
+      # remove the earliest directories we can until there's enough space again
+      for delete_dir in get_dirs_to_delete(dirs, get_bytes_to_free(available_bytes, available_percent)):
+        if exit_event.is_set():
+          break
 
+        path = os.path.join(Paths.log_root(), delete_dir)
         try:
-          cloudlog.info(f"deleting {delete_path}")
-          if os.path.isfile(delete_path):
-            os.remove(delete_path)
-          else:
-            shutil.rmtree(delete_path)
-          break
+          cloudlog.info(f"deleting {path}")
+          delete_path(path, unlinks, exit_event)
+          invalidate(path)
         except OSError:
-          cloudlog.exception(f"issue deleting {delete_path}")
+          cloudlog.exception(f"issue deleting {path}")
       exit_event.wait(.1)
     else:
       exit_event.wait(30)
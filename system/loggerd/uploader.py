@@ -1,6 +1,4 @@
 #!/usr/bin/env python3
-import bz2
-import io
 import json
 import os
 import random
@@ -9,17 +7,24 @@ import threading
 import time
 import traceback
 import datetime
+import heapq
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 from typing import BinaryIO
-from collections.abc import Iterator
+from collections.abc import Callable
 
 from cereal import log
 import cereal.messaging as messaging
 from openpilot.common.api import Api
+from openpilot.common.file_helpers import Bz2CompressingReader
+from openpilot.common.inotify import (Inotify, IN_CLOSE_WRITE, IN_CREATE, IN_DELETE, IN_DELETE_SELF, IN_ISDIR, IN_MOVED_FROM,
+                                      IN_MOVED_TO, IN_Q_OVERFLOW)
 from openpilot.common.params import Params
 from openpilot.common.realtime import set_core_affinity
+from openpilot.common.token_bucket import TokenBucket
 from openpilot.system.hardware.hw import Paths
 from openpilot.system.loggerd.xattr_cache import getxattr, setxattr
 from openpilot.common.swaglog import cloudlog
+from openpilot.system.statsd import statlog
 
 NetworkType = log.DeviceState.NetworkType
 UPLOAD_ATTR_NAME = 'user.upload'
@@ -27,10 +32,20 @@ UPLOAD_ATTR_VALUE = b'1'
 
 UPLOAD_QLOG_QCAM_MAX_SIZE = 5 * 1e6  # MB
 
+ROOT_WATCH_MASK = IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO
+DIR_WATCH_MASK = IN_CREATE | IN_DELETE | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_DELETE_SELF
+
 allow_sleep = bool(os.getenv("UPLOADER_SLEEP", "1"))
 force_wifi = os.getenv("FORCEWIFI") is not None
 fake_upload = os.getenv("FAKEUPLOAD") is not None
 
+# concurrent uploads when offroad on an unmetered network, otherwise files are uploaded one at a time
+UPLOAD_WORKERS = int(os.getenv("UPLOADER_WORKERS", "4"))
+# global bandwidth limits in MB/s, 0 is unlimited
+UPLOAD_RATE_ONROAD = float(os.getenv("UPLOADER_RATE_ONROAD", "0"))
+UPLOAD_RATE_OFFROAD = float(os.getenv("UPLOADER_RATE_OFFROAD", "0"))
+UPLOAD_RATE_METERED = float(os.getenv("UPLOADER_RATE_METERED", "0"))
+
 
 class FakeRequest:
   def __init__(self):
@@ -60,6 +75,11 @@ def listdir_by_creation(d: str) -> list[str]:
     cloudlog.exception("listdir_by_creation failed")
     return []
 
+def get_upload_rate(offroad: bool, metered: bool) -> float:
+  if metered:
+    return UPLOAD_RATE_METERED * 1e6
+  return (UPLOAD_RATE_OFFROAD if offroad else UPLOAD_RATE_ONROAD) * 1e6
+
 def clear_locks(root: str) -> None:
   for logdir in os.listdir(root):
     path = os.path.join(root, logdir)
@@ -71,6 +91,187 @@ def clear_locks(root: str) -> None:
       cloudlog.exception("clear_locks failed")
 
 
+class UploadQueue:
+  """Priority queue of files that still need to be uploaded.
+
+  The log root is scanned once, after that only directories reported as changed by
+  inotify (new segments, lock removal on segment close, new crash/boot logs) are rescanned.
+  Segments are watched until they're closed and all their files are uploaded, so the number
+  of watches stays small.
+  Without inotify the whole log root is rescanned on every call, like the original listing.
+  """
+  def __init__(self, root: str, immediate_folders: list[str], immediate_priority: dict[str, int]):
+    self.root = root
+    self.immediate_folders = immediate_folders
+    self.immediate_priority = immediate_priority
+
+    self.heap: list[tuple[tuple, str]] = []
+    self.entries: dict[str, tuple[tuple, str, str, float]] = {}  # fn -> (priority, name, key, ctime)
+    self.dir_entries: dict[str, set[str]] = {}
+    self.dirty: set[str] = set()
+    self.seeded = False
+    self.lock = threading.Lock()
+
+    self.inotify = Inotify() if Inotify.available() else None
+
+  def __len__(self) -> int:
+    return len(self.entries)
+
+  def priority(self, logdir: str, fn: str, name: str) -> tuple | None:
+    is_immediate_folder = any(f in fn for f in self.immediate_folders)
+    if not is_immediate_folder and name not in self.immediate_priority:
+      # never selected for upload
+      return None
+    return (not is_immediate_folder, get_directory_sort(logdir), self.immediate_priority.get(name, 1000), name)
+
+  def watch(self, path: str, mask: int) -> bool:
+    if self.inotify is None:
+      return False
+    try:
+      self.inotify.add_watch(path, mask)
+      return True
+    except OSError:
+      cloudlog.exception("uploader_add_watch_failed")
+      return False
+
+  def unwatch(self, path: str) -> None:
+    if self.inotify is not None:
+      self.inotify.rm_watch(path)
+
+  def is_immediate_folder(self, logdir: str) -> bool:
+    return any(f.rstrip("/") == logdir for f in self.immediate_folders)
+
+  def seed(self) -> None:
+    self.heap.clear()
+    self.entries.clear()
+    self.dir_entries.clear()
+    self.dirty.clear()
+    if self.inotify is not None:
+      for path in list(self.inotify.watches.values()):
+        self.inotify.rm_watch(path)
+
+    self.seeded = self.watch(self.root, ROOT_WATCH_MASK)
+    for logdir in listdir_by_creation(self.root):
+      self.scan_dir(logdir)
+
+  def scan_dir(self, logdir: str) -> None:
+    path = os.path.join(self.root, logdir)
+    try:
+      names = os.listdir(path)
+    except OSError:
+      self.drop_dir(logdir)
+      return
+
+    locked = any(name.endswith(".lock") for name in names)
+    if locked:
+      self.drop_dir(logdir)
+    else:
+      self.add_files(logdir, path, names)
+
+    # keep watching segments still being written (or just created and still empty), segments
+    # with files left to upload, and folders that keep receiving files
+    if locked or not names or self.dir_entries.get(logdir) or self.is_immediate_folder(logdir):
+      self.watch(path, DIR_WATCH_MASK)
+    else:
+      self.unwatch(path)
+
+  def add_files(self, logdir: str, path: str, names: list[str]) -> None:
+    for name in names:
+      fn = os.path.join(path, name)
+      if fn in self.entries:
+        continue
+
+      priority = self.priority(logdir, fn, name)
+      if priority is None:
+        continue
+
+      key = os.path.join(logdir, name)
+      try:
+        st = os.stat(fn)
+        ctime = st.st_ctime
+        is_uploaded = getxattr(fn, UPLOAD_ATTR_NAME, st) == UPLOAD_ATTR_VALUE
+      except OSError:
+        cloudlog.event("uploader_getxattr_failed", key=key, fn=fn)
+        # deleter could have deleted, so skip
+        continue
+      if is_uploaded:
+        continue
+
+      self.entries[fn] = (priority, name, key, ctime)
+      self.dir_entries.setdefault(logdir, set()).add(fn)
+      heapq.heappush(self.heap, (priority, fn))
+
+  def drop_dir(self, logdir: str) -> None:
+    for fn in self.dir_entries.pop(logdir, set()):
+      self.entries.pop(fn, None)
+
+  def remove(self, fn: str) -> None:
+    with self.lock:
+      if self.entries.pop(fn, None) is not None:
+        logdir = os.path.basename(os.path.dirname(fn))
+        dir_entries = self.dir_entries.get(logdir, set())
+        dir_entries.discard(fn)
+        # closed segment with all files uploaded
+        if not dir_entries and not self.is_immediate_folder(logdir):
+          self.dir_entries.pop(logdir, None)
+          self.unwatch(os.path.dirname(fn))
+
+  def update(self) -> None:
+    if not self.seeded:
+      self.seed()
+      return
+
+    for event in self.inotify.read():
+      if event.mask & IN_Q_OVERFLOW:
+        cloudlog.event("uploader_inotify_overflow")
+        self.seed()
+        return
+
+      if event.path == self.root:
+        if event.mask & IN_ISDIR and event.mask & (IN_DELETE | IN_MOVED_FROM):
+          self.drop_dir(event.name)
+          self.dirty.discard(event.name)
+        elif event.mask & IN_ISDIR:
+          self.dirty.add(event.name)
+      elif event.path:
+        self.dirty.add(os.path.basename(event.path))
+
+    for logdir in self.dirty:
+      self.scan_dir(logdir)
+    self.dirty.clear()
+
+  def next(self, skip: Callable[[str, str, str, float], bool]) -> tuple[str, str, str] | None:
+    with self.lock:
+      return self._next(skip)
+
+  def _next(self, skip: Callable[[str, str, str, float], bool]) -> tuple[str, str, str] | None:
+    self.update()
+
+    # entries removed since they were pushed are only dropped when popped, rebuild once they pile up
+    if len(self.heap) > 2 * len(self.entries) + 64:
+      self.heap = [(entry[0], fn) for fn, entry in self.entries.items()]
+      heapq.heapify(self.heap)
+
+    ret = None
+    skipped = []
+    while self.heap:
+      priority, fn = heapq.heappop(self.heap)
+      entry = self.entries.get(fn)
+      if entry is None or entry[0] != priority:
+        # removed since it was pushed
+        continue
+
+      skipped.append((priority, fn))
+      _, name, key, ctime = entry
+      if not skip(fn, key, name, ctime):
+        ret = name, key, fn
+        break
+
+    for item in skipped:
+      heapq.heappush(self.heap, item)
+    return ret
+
+
 class Uploader:
   def __init__(self, dongle_id: str, root: str):
     self.dongle_id = dongle_id
@@ -85,57 +286,43 @@ class Uploader:
     self.immediate_folders = ["crash/", "boot/"]
     self.immediate_priority = {"qlog": 0, "qlog.bz2": 0, "qcamera.ts": 1}
 
-  def list_upload_files(self, metered: bool) -> Iterator[tuple[str, str, str]]:
-    r = self.params.get("AthenadRecentlyViewedRoutes", encoding="utf8")
-    requested_routes = [] if r is None else r.split(",")
+    self.upload_queue = UploadQueue(root, self.immediate_folders, self.immediate_priority)
 
-    for logdir in listdir_by_creation(self.root):
-      path = os.path.join(self.root, logdir)
-      try:
-        names = os.listdir(path)
-      except OSError:
-        continue
+    self.bandwidth = TokenBucket()
+    self.executor = ThreadPoolExecutor(max_workers=max(UPLOAD_WORKERS, 1), thread_name_prefix="upload")
+    self.in_flight: dict[Future, str] = {}
+    self.session_local = threading.local()
+    self.stats_lock = threading.Lock()
 
-      if any(name.endswith(".lock") for name in names):
-        continue
+  def get_session(self) -> requests.Session:
+    # one persistent session per upload thread to reuse connections
+    if not hasattr(self.session_local, "session"):
+      self.session_local.session = requests.Session()
+    return self.session_local.session
 
-      for name in sorted(names, key=lambda n: self.immediate_priority.get(n, 1000)):
-        key = os.path.join(logdir, name)
-        fn = os.path.join(path, name)
-        # skip files already uploaded
-        try:
-          ctime = os.path.getctime(fn)
-          is_uploaded = getxattr(fn, UPLOAD_ATTR_NAME) == UPLOAD_ATTR_VALUE
-        except OSError:
-          cloudlog.event("uploader_getxattr_failed", key=key, fn=fn)
-          # deleter could have deleted, so skip
-          continue
-        if is_uploaded:
-          continue
-
-        # limit uploading on metered connections
-        if metered:
-          dt = datetime.timedelta(hours=12)
-          if logdir in self.immediate_folders and (datetime.datetime.now() - datetime.datetime.fromtimestamp(ctime)) < dt:
-            continue
-
-          if name == "qcamera.ts" and not any(logdir.startswith(r.split('|')[-1]) for r in requested_routes):
-            continue
-
-        yield name, key, fn
+  def get_requested_routes(self) -> list[str]:
+    r = self.params.get("AthenadRecentlyViewedRoutes", encoding="utf8")
+    return [] if r is None else r.split(",")
 
-  def next_file_to_upload(self, metered: bool) -> tuple[str, str, str] | None:
-    upload_files = list(self.list_upload_files(metered))
+  def skip_metered(self, logdir: str, name: str, ctime: float, requested_routes: list[str]) -> bool:
+    # limit uploading on metered connections
+    dt = datetime.timedelta(hours=12)
+    if logdir in self.immediate_folders and (datetime.datetime.now() - datetime.datetime.fromtimestamp(ctime)) < dt:
+      return True
+
+    if name == "qcamera.ts" and not any(logdir.startswith(r.split('|')[-1]) for r in requested_routes):
+      return True
 
-    for name, key, fn in upload_files:
-      if any(f in fn for f in self.immediate_folders):
-        return name, key, fn
+    return False
 
-    for name, key, fn in upload_files:
-      if name in self.immediate_priority:
-        return name, key, fn
+  def next_file_to_upload(self, metered: bool) -> tuple[str, str, str] | None:
+    uploading = set(self.in_flight.values())
+    if not metered:
+      return self.upload_queue.next(lambda fn, key, name, ctime: fn in uploading)
 
-    return None
+    requested_routes = self.get_requested_routes()
+    return self.upload_queue.next(lambda fn, key, name, ctime: fn in uploading or
+                                  self.skip_metered(os.path.dirname(key), name, ctime, requested_routes))
 
   def do_upload(self, key: str, fn: str):
     url_resp = self.api.get("v1.4/" + self.dongle_id + "/upload_url/", timeout=10, path=key, access_token=self.api.get_token())
@@ -151,20 +338,20 @@ class Uploader:
       return FakeResponse()
 
     with open(fn, "rb") as f:
-      data: BinaryIO
+      data: BinaryIO | Bz2CompressingReader
       if key.endswith('.bz2') and not fn.endswith('.bz2'):
-        compressed = bz2.compress(f.read())
-        data = io.BytesIO(compressed)
+        data = Bz2CompressingReader(f)
       else:
         data = f
 
-      return requests.put(url, data=data, headers=headers, timeout=10)
+      return self.get_session().put(url, data=self.bandwidth.wrap(data), headers=headers, timeout=10)
 
   def upload(self, name: str, key: str, fn: str, network_type: int, metered: bool) -> bool:
     try:
       sz = os.path.getsize(fn)
     except OSError:
       cloudlog.exception("upload: getsize failed")
+      self.upload_queue.remove(fn)
       return False
 
     cloudlog.event("upload_start", key=key, fn=fn, sz=sz, network_type=network_type, metered=metered)
@@ -195,10 +382,16 @@ class Uploader:
           speed = (content_length / 1e6) / dt
           cloudlog.event("upload_success", key=key, fn=fn, sz=sz, content_length=content_length,
                          network_type=network_type, metered=metered, speed=speed)
+          with self.stats_lock:
+            statlog.sample("uploader.upload_speed", speed)
+            statlog.sample("uploader.upload_duration", dt)
+            statlog.sample("uploader.upload_size", content_length / 1e6)
         success = True
       else:
         success = False
         cloudlog.event("upload_failed", stat=stat, exc=last_exc, key=key, fn=fn, sz=sz, network_type=network_type, metered=metered)
+        with self.stats_lock:
+          statlog.sample("uploader.upload_failed", 1)
 
     if success:
       # tag file as uploaded
@@ -206,22 +399,41 @@ class Uploader:
         setxattr(fn, UPLOAD_ATTR_NAME, UPLOAD_ATTR_VALUE)
       except OSError:
         cloudlog.event("uploader_setxattr_failed", exc=last_exc, key=key, fn=fn, sz=sz)
+      self.upload_queue.remove(fn)
 
     return success
 
 
-  def step(self, network_type: int, metered: bool) -> bool | None:
-    d = self.next_file_to_upload(metered)
-    if d is None:
-      return None
+  def step(self, network_type: int, metered: bool, max_uploads: int = 1) -> bool | None:
+    """Starts uploads until max_uploads are in flight, then waits for at least one to finish.
+    Returns None if there was nothing to upload, otherwise whether all finished uploads succeeded."""
+    while len(self.in_flight) < max_uploads:
+      d = self.next_file_to_upload(metered)
+      if d is None:
+        break
+
+      name, key, fn = d
 
-    name, key, fn = d
+      # qlogs and bootlogs need to be compressed before uploading
+      if key.endswith(('qlog', 'rlog')) or (key.startswith('boot/') and not key.endswith('.bz2')):
+        key += ".bz2"
 
-    # qlogs and bootlogs need to be compressed before uploading
-    if key.endswith(('qlog', 'rlog')) or (key.startswith('boot/') and not key.endswith('.bz2')):
-      key += ".bz2"
+      future = self.executor.submit(self.upload, name, key, fn, network_type, metered)
+      self.in_flight[future] = fn
 
-    return self.upload(name, key, fn, network_type, metered)
+    if not self.in_flight:
+      return None
+
+    with self.stats_lock:
+      statlog.gauge("uploader.in_flight", len(self.in_flight))
+      statlog.gauge("uploader.queue_size", len(self.upload_queue))
+
+    done, _ = wait(self.in_flight, return_when=FIRST_COMPLETED)
+    success = True
+    for future in done:
+      del self.in_flight[future]
+      success = future.result() and success
+    return success
 
 
 def main(exit_event: threading.Event = None) -> None:
@@ -257,7 +469,10 @@ def main(exit_event: threading.Event = None) -> None:
         time.sleep(60 if offroad else 5)
       continue
 
-    success = uploader.step(sm['deviceState'].networkType.raw, sm['deviceState'].networkMetered)
+    metered = sm['deviceState'].networkMetered
+    uploader.bandwidth.set_rate(get_upload_rate(offroad, metered))
+    max_uploads = UPLOAD_WORKERS if offroad and not metered else 1
+    success = uploader.step(sm['deviceState'].networkType.raw, metered, max_uploads)
     if success is None:
       backoff = 60 if offroad else 5
     elif success:
@@ -268,6 +483,9 @@ def main(exit_event: threading.Event = None) -> None:
     if allow_sleep:
       time.sleep(backoff + random.uniform(0, backoff))
 
+  # let running uploads finish, queued ones are dropped
+  uploader.executor.shutdown(wait=True, cancel_futures=True)
+
 
 if __name__ == "__main__":
   main()
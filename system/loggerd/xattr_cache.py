@@ -1,22 +1,80 @@
 import os
 import errno
+import threading
+from collections import OrderedDict
 
-_cached_attributes: dict[tuple, bytes | None] = {}
+# max number of (path, attribute) entries kept, least recently used entries are evicted first
+CACHE_MAX_SIZE = 8192
+
+# (path, attr_name) -> (inode, ctime_ns, value)
+# setting an xattr updates the ctime, so entries changed by other processes are detected from a stat
+_cached_attributes: OrderedDict[tuple, tuple[int, int, bytes | None]] = OrderedDict()
+# directory -> keys of the cached entries directly in it, so a deleted directory is dropped without a full scan
+_dir_keys: dict[str, set[tuple]] = {}
+_lock = threading.Lock()
+
+def _read_xattr(path: str, attr_name: str) -> bytes | None:
+  try:
+    return os.getxattr(path, attr_name)
+  except OSError as e:
+    # ENODATA means attribute hasn't been set
+    if e.errno == errno.ENODATA:
+      return None
+    raise
+
+def _pop(key: tuple) -> None:
+  if _cached_attributes.pop(key, None) is not None:
+    dirname = os.path.dirname(key[0])
+    keys = _dir_keys.get(dirname)
+    if keys is not None:
+      keys.discard(key)
+      if not keys:
+        del _dir_keys[dirname]
+
+def getxattr(path: str, attr_name: str, st: os.stat_result | None = None) -> bytes | None:
+  """Returns the attribute value or None if it isn't set.
+  The cached value is validated against a stat of the file, pass st if the caller already has one."""
+  if st is None:
+    st = os.stat(path)
+  stamp = (st.st_ino, st.st_ctime_ns)
 
-def getxattr(path: str, attr_name: str) -> bytes | None:
   key = (path, attr_name)
-  if key not in _cached_attributes:
-    try:
-      response = os.getxattr(path, attr_name)
-    except OSError as e:
-      # ENODATA means attribute hasn't been set
-      if e.errno == errno.ENODATA:
-        response = None
-      else:
-        raise
-    _cached_attributes[key] = response
-  return _cached_attributes[key]
+  with _lock:
+    cached = _cached_attributes.get(key)
+    if cached is not None and cached[:2] == stamp:
+      _cached_attributes.move_to_end(key)
+      return cached[2]
+
+  response = _read_xattr(path, attr_name)
+  with _lock:
+    _cached_attributes[key] = (*stamp, response)
+    _cached_attributes.move_to_end(key)
+    _dir_keys.setdefault(os.path.dirname(path), set()).add(key)
+    while len(_cached_attributes) > CACHE_MAX_SIZE:
+      _pop(next(iter(_cached_attributes)))
+  return response
+
+def getxattr_dir(path: str, attr_name: str) -> dict[str, bytes | None]:
+  """Returns the attribute value of every entry in a directory, keyed by name"""
+  values = {}
+  with os.scandir(path) as it:
+    for entry in it:
+      try:
+        values[entry.name] = getxattr(entry.path, attr_name, entry.stat())
+      except OSError:
+        # entry could have been deleted
+        continue
+  return values
 
 def setxattr(path: str, attr_name: str, attr_value: bytes) -> None:
-  _cached_attributes.pop((path, attr_name), None)
+  with _lock:
+    _pop((path, attr_name))
   return os.setxattr(path, attr_name, attr_value)
+
+def invalidate(path: str) -> None:
+  """Drops the cached attributes of path and of the entries directly in it, call after deleting it"""
+  path = path.rstrip("/")
+  with _lock:
+    keys = [k for k in _dir_keys.get(os.path.dirname(path), ()) if k[0] == path]
+    for key in keys + list(_dir_keys.get(path, ())):
+      _pop(key)
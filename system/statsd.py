@@ -1,7 +1,9 @@
 #!/usr/bin/env python3
 import os
 import zmq
+import math
 import time
+import contextlib
 from pathlib import Path
 from collections import defaultdict
 from datetime import datetime, UTC
@@ -21,6 +23,87 @@ class METRIC_TYPE:
   GAUGE = 'g'
   SAMPLE = 'sa'
 
+# largest value with its own bucket, keeps gamma ** key finite
+MAX_BUCKET_VALUE = 1e300
+
+class QuantileSketch:
+  """Fixed memory quantile sketch (DDSketch) with a relative accuracy of alpha.
+  Values are counted in logarithmically sized buckets, sketches of the same alpha can be merged."""
+  def __init__(self, alpha: float = 0.01, max_buckets: int = 2048):
+    self.gamma = (1 + alpha) / (1 - alpha)
+    self.log_gamma = math.log(self.gamma)
+    self.max_buckets = max_buckets
+    self.positive: dict[int, int] = defaultdict(int)
+    self.negative: dict[int, int] = defaultdict(int)
+    self.zero_count = 0
+    self.count = 0
+    self.sum = 0.
+    self.min = math.inf
+    self.max = -math.inf
+
+  def _key(self, value: float) -> int:
+    # inf is clamped into the top bucket, min/max/sum still see the real value
+    return math.ceil(math.log(min(value, MAX_BUCKET_VALUE)) / self.log_gamma)
+
+  def _value(self, key: int) -> float:
+    return 2 * self.gamma ** key / (self.gamma + 1)
+
+  def _collapse(self, buckets: dict[int, int]) -> None:
+    # merge the smallest buckets, keeps accuracy for the larger (more interesting) values
+    keys = sorted(buckets)
+    for i in range(len(buckets) - self.max_buckets):
+      buckets[keys[i + 1]] += buckets.pop(keys[i])
+
+  def add(self, value: float) -> None:
+    if value > 1e-9:
+      self.positive[self._key(value)] += 1
+      if len(self.positive) > self.max_buckets:
+        self._collapse(self.positive)
+    elif value < -1e-9:
+      self.negative[self._key(-value)] += 1
+      if len(self.negative) > self.max_buckets:
+        self._collapse(self.negative)
+    else:
+      self.zero_count += 1
+    self.count += 1
+    self.sum += value
+    self.min = min(self.min, value)
+    self.max = max(self.max, value)
+
+  def merge(self, other: 'QuantileSketch') -> None:
+    assert math.isclose(self.gamma, other.gamma), "can only merge sketches with the same accuracy"
+    for key, count in other.positive.items():
+      self.positive[key] += count
+    for key, count in other.negative.items():
+      self.negative[key] += count
+    self._collapse(self.positive)
+    self._collapse(self.negative)
+    self.zero_count += other.zero_count
+    self.count += other.count
+    self.sum += other.sum
+    self.min = min(self.min, other.min)
+    self.max = max(self.max, other.max)
+
+  def quantiles(self, qs: list[float]) -> list[float]:
+    # values in ascending order: most negative first, then zero, then positive
+    buckets = [(-self._value(k), c) for k, c in sorted(self.negative.items(), reverse=True)]
+    if self.zero_count:
+      buckets.append((0., self.zero_count))
+    buckets += [(self._value(k), c) for k, c in sorted(self.positive.items())]
+
+    ret = []
+    for q in qs:
+      # same nearest rank as indexing a sorted list of all samples
+      rank = int(round(q * (self.count - 1)))
+      seen = 0
+      for value, count in buckets:
+        seen += count
+        if seen > rank:
+          ret.append(min(max(value, self.min), self.max))
+          break
+    return ret
+
+
 class StatLog:
   def __init__(self):
     self.pid = None
@@ -58,23 +141,53 @@ class StatLog:
   def sample(self, name: str, value: float):
     self._send(f"{name}:{value}|{METRIC_TYPE.SAMPLE}")
 
+  @contextlib.contextmanager
+  def timing(self, name: str):
+    """Records the time spent in the block in milliseconds as a sample"""
+    start = time.monotonic()
+    try:
+      yield
+    finally:
+      self.sample(name, (time.monotonic() - start) * 1e3)
+
+
+def ingest_metric(metric: str, gauges: dict[str, float], samples: dict[str, QuantileSketch]) -> None:
+  try:
+    metric_type = metric.split('|')[1]
+    metric_name = metric.split(':')[0]
+    metric_value = float(metric.split('|')[0].split(':')[1])
+
+    if metric_type == METRIC_TYPE.GAUGE:
+      gauges[metric_name] = metric_value
+    elif metric_type == METRIC_TYPE.SAMPLE:
+      samples[metric_name].add(metric_value)
+    else:
+      cloudlog.event("unknown metric type", metric_type=metric_type)
+  except Exception:
+    cloudlog.event("malformed metric", metric=metric)
+
+
+def get_sample_stats(sketch: QuantileSketch) -> dict[str, float]:
+  stats = {
+    'count': sketch.count,
+    'min': sketch.min,
+    'max': sketch.max,
+    'mean': sketch.sum / sketch.count,
+  }
+  percentiles = [0.05, 0.5, 0.95]
+  for percentile, value in zip(percentiles, sketch.quantiles(percentiles), strict=True):
+    stats[f"p{int(percentile * 100)}"] = value
+  return stats
+
 
 def main() -> NoReturn:
   dongle_id = Params().get("DongleId", encoding='utf-8')
-  def get_influxdb_line(measurement: str, value: float | dict[str, float],  timestamp: datetime, tags: dict) -> str:
-    res = f"{measurement}"
-    for k, v in tags.items():
-      res += f",{k}={str(v)}"
-    res += " "
-
+  def get_influxdb_line(measurement: str, value: float | dict[str, float], suffix: str, tags_str: str) -> str:
     if isinstance(value, float):
       value = {'value': value}
 
-    for k, v in value.items():
-      res += f"{k}={v},"
-
-    res += f"dongle_id=\"{dongle_id}\" {int(timestamp.timestamp() * 1e9)}\n"
-    return res
+    fields = "".join(f"{k}={v}," for k, v in value.items())
+    return f"{measurement}{tags_str} {fields}{suffix}"
 
   # open statistics socket
   ctx = zmq.Context.instance()
@@ -104,7 +217,7 @@ def main() -> NoReturn:
   idx = 0
   last_flush_time = time.monotonic()
   gauges = {}
-  samples: dict[str, list[float]] = defaultdict(list)
+  samples: dict[str, QuantileSketch] = defaultdict(QuantileSketch)
   try:
     while True:
       started_prev = sm['deviceState'].started
@@ -113,48 +226,25 @@ def main() -> NoReturn:
       # Update metrics
       while True:
         try:
-          metric = sock.recv_string(zmq.NOBLOCK)
-          try:
-            metric_type = metric.split('|')[1]
-            metric_name = metric.split(':')[0]
-            metric_value = float(metric.split('|')[0].split(':')[1])
-
-            if metric_type == METRIC_TYPE.GAUGE:
-              gauges[metric_name] = metric_value
-            elif metric_type == METRIC_TYPE.SAMPLE:
-              samples[metric_name].append(metric_value)
-            else:
-              cloudlog.event("unknown metric type", metric_type=metric_type)
-          except Exception:
-            cloudlog.event("malformed metric", metric=metric)
+          ingest_metric(sock.recv_string(zmq.NOBLOCK), gauges, samples)
         except zmq.error.Again:
           break
 
       # flush when started state changes or after FLUSH_TIME_S
       if (time.monotonic() > last_flush_time + STATS_FLUSH_TIME_S) or (sm['deviceState'].started != started_prev):
-        result = ""
+        lines = []
         current_time = datetime.utcnow().replace(tzinfo=UTC)
         tags['started'] = sm['deviceState'].started
 
-        for key, value in gauges.items():
-          result += get_influxdb_line(f"gauge.{key}", value, current_time, tags)
-
-        for key, values in samples.items():
-          values.sort()
-          sample_count = len(values)
-          sample_sum = sum(values)
+        # tags and timestamp are shared by all lines of a flush
+        tags_str = "".join(f",{k}={str(v)}" for k, v in tags.items())
+        suffix = f"dongle_id=\"{dongle_id}\" {int(current_time.timestamp() * 1e9)}\n"
 
-          stats = {
-            'count': sample_count,
-            'min': values[0],
-            'max': values[-1],
-            'mean': sample_sum / sample_count,
-          }
-          for percentile in [0.05, 0.5, 0.95]:
-            value = values[int(round(percentile * (sample_count - 1)))]
-            stats[f"p{int(percentile * 100)}"] = value
+        for key, value in gauges.items():
+          lines.append(get_influxdb_line(f"gauge.{key}", value, suffix, tags_str))
 
-          result += get_influxdb_line(f"sample.{key}", stats, current_time, tags)
+        for key, sketch in samples.items():
+          lines.append(get_influxdb_line(f"sample.{key}", get_sample_stats(sketch), suffix, tags_str))
 
         # clear intermediate data
         gauges.clear()
@@ -163,10 +253,10 @@ def main() -> NoReturn:
 
         # check that we aren't filling up the drive
         if len(os.listdir(STATS_DIR)) < STATS_DIR_FILE_LIMIT:
-          if len(result) > 0:
+          if len(lines) > 0:
             stats_path = os.path.join(STATS_DIR, f"{current_time.timestamp():.0f}_{idx}")
             with atomic_write_in_dir(stats_path) as f:
-              f.write(result)
+              f.write("".join(lines))
             idx += 1
         else:
           cloudlog.error("stats dir full")
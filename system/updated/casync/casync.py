@@ -1,13 +1,16 @@
 #!/usr/bin/env python3
 import io
 import lzma
+import mmap
 import os
 import pathlib
 import struct
 import sys
+import threading
 import time
 from abc import ABC, abstractmethod
-from collections import defaultdict, namedtuple
+from collections import defaultdict, deque, namedtuple
+from concurrent.futures import Future, ThreadPoolExecutor
 from collections.abc import Callable
 from typing import IO
 
@@ -31,6 +34,8 @@ CHUNK_DOWNLOAD_RETRIES = 3
 
 CAIBX_DOWNLOAD_TIMEOUT = 120
 
+EXTRACT_WORKERS = 8  # chunks fetched, decompressed and verified in parallel
+
 Chunk = namedtuple('Chunk', ['sha', 'offset', 'length'])
 ChunkDict = dict[bytes, Chunk]
 
@@ -46,16 +51,22 @@ class BinaryChunkReader(ChunkReader):
   def __init__(self, file_like: IO[bytes]) -> None:
     super().__init__()
     self.f = file_like
+    self.lock = threading.Lock()
 
   def read(self, chunk: Chunk) -> bytes:
-    self.f.seek(chunk.offset)
-    return self.f.read(chunk.length)
+    with self.lock:
+      self.f.seek(chunk.offset)
+      return self.f.read(chunk.length)
 
 
 class FileChunkReader(BinaryChunkReader):
   def __init__(self, path: str) -> None:
     super().__init__(open(path, 'rb'))
 
+  def read(self, chunk: Chunk) -> bytes:
+    # positional reads don't share a file offset, so no locking is needed between threads
+    return os.pread(self.f.fileno(), chunk.length, chunk.offset)
+
   def __del__(self):
     self.f.close()
 
@@ -66,7 +77,14 @@ class RemoteChunkReader(ChunkReader):
   def __init__(self, url: str) -> None:
     super().__init__()
     self.url = url
-    self.session = requests.Session()
+    self.local = threading.local()
+
+  @property
+  def session(self) -> requests.Session:
+    # one session per thread, chunks are downloaded in parallel
+    if not hasattr(self.local, "session"):
+      self.local.session = requests.Session()
+    return self.local.session
 
   def read(self, chunk: Chunk) -> bytes:
     sha_hex = chunk.sha.hex()
@@ -165,41 +183,110 @@ def build_chunk_dict(chunks: list[Chunk]) -> ChunkDict:
   return r
 
 
-def extract(target: list[Chunk],
-            sources: list[tuple[str, ChunkReader, ChunkDict]],
-            out_path: str,
-            progress: Callable[[int], None] = None):
-  stats: dict[str, int] = defaultdict(int)
+def read_chunk(chunk: Chunk, sources: list[tuple[str, ChunkReader, ChunkDict]]) -> tuple[str, bytes]:
+  """Reads and verifies a chunk from the first source that has it"""
+  for name, chunk_reader, store_chunks in sources:
+    if chunk.sha in store_chunks:
+      bts = chunk_reader.read(store_chunks[chunk.sha])
 
-  mode = 'rb+' if os.path.exists(out_path) else 'wb'
-  with open(out_path, mode) as out:
-    for cur_chunk in target:
+      # Check length
+      if len(bts) != chunk.length:
+        continue
 
-      # Find source for desired chunk
-      for name, chunk_reader, store_chunks in sources:
-        if cur_chunk.sha in store_chunks:
-          bts = chunk_reader.read(store_chunks[cur_chunk.sha])
+      # Check hash
+      if SHA512.new(bts, truncate="256").digest() != chunk.sha:
+        continue
 
-          # Check length
-          if len(bts) != cur_chunk.length:
-            continue
+      return name, bts
 
-          # Check hash
-          if SHA512.new(bts, truncate="256").digest() != cur_chunk.sha:
-            continue
+  raise RuntimeError("Desired chunk not found in provided stores")
 
-          # Write to output
-          out.seek(cur_chunk.offset)
-          out.write(bts)
 
-          stats[name] += cur_chunk.length
+def find_existing_chunks(target: list[Chunk], out_path: str, workers: int = EXTRACT_WORKERS) -> list[bool]:
+  """Hashes the current contents of out_path at the offset of every target chunk.
+  Returns for each target chunk whether the bytes already there are correct."""
+  if not os.path.exists(out_path):
+    return [False] * len(target)
 
-          if progress is not None:
-            progress(sum(stats.values()))
+  with open(out_path, 'rb') as f:
+    # works for block devices too, their file size is 0
+    size = f.seek(0, os.SEEK_END)
+    if size == 0:
+      return [False] * len(target)
 
-          break
-      else:
-        raise RuntimeError("Desired chunk not found in provided stores")
+    with mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ) as mm:
+      def check(chunk: Chunk) -> bool:
+        if chunk.offset + chunk.length > size:
+          return False
+        return SHA512.new(mm[chunk.offset:chunk.offset + chunk.length], truncate="256").digest() == chunk.sha
+
+      with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+        return list(executor.map(check, target))
+
+
+def extract(target: list[Chunk],
+            sources: list[tuple[str, ChunkReader, ChunkDict]],
+            out_path: str,
+            progress: Callable[[int], None] = None,
+            workers: int = EXTRACT_WORKERS,
+            skip_existing: bool = True):
+  """Chunks are fetched, decompressed and verified by a thread pool, and written in target order.
+  A chunk that occurs several times in the target is only read once.
+  With skip_existing, chunks that are already correct in out_path are neither read nor written again."""
+  stats: dict[str, int] = defaultdict(int)
+  total = 0
+
+  existing = find_existing_chunks(target, out_path, workers) if skip_existing else [False] * len(target)
+
+  # target offsets of every unique chunk that needs to be written, in order of first occurrence
+  unique_chunks: dict[bytes, list[Chunk]] = {}
+  for chunk, is_existing in zip(target, existing, strict=True):
+    if is_existing:
+      stats['existing'] += chunk.length
+      total += chunk.length
+    else:
+      unique_chunks.setdefault(chunk.sha, []).append(chunk)
+
+  if progress is not None and total > 0:
+    progress(total)
+
+  mode = 'rb+' if os.path.exists(out_path) else 'wb'
+  with open(out_path, mode) as out, ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+    pending: deque[tuple[list[Chunk], Future]] = deque()
+    chunks_iter = iter(unique_chunks.values())
+
+    def submit() -> bool:
+      chunks = next(chunks_iter, None)
+      if chunks is None:
+        return False
+      pending.append((chunks, executor.submit(read_chunk, chunks[0], sources)))
+      return True
+
+    # bound the number of chunks held in memory
+    for _ in range(max(workers, 1) * 4):
+      if not submit():
+        break
+
+    while pending:
+      chunks, future = pending.popleft()
+      try:
+        name, bts = future.result()
+      except Exception:
+        for _, f in pending:
+          f.cancel()
+        raise
+      submit()
+
+      # Write to output
+      for chunk in chunks:
+        out.seek(chunk.offset)
+        out.write(bts)
+
+        stats[name] += chunk.length
+        total += chunk.length
+
+      if progress is not None:
+        progress(total)
 
   return stats
 
@@ -298,6 +298,37 @@ cdef class AcadosOcpSolverCython:
         return out
 
 
+    def get_all_stages(self, str field_):
+        """
+        Get the last solution of the solver at all shooting nodes at once:
+
+            :param field: string in ['x', 'u', 'z', 'pi', 'lam', 't', 'sl', 'su',]
+            :returns: 2D array with one row per stage, N rows for 'u' and 'pi', N+1 rows otherwise
+
+            .. note:: rows of stages with a smaller dimension than the largest one are zero padded
+        """
+
+        out_fields = ['x', 'u', 'z', 'pi', 'lam', 't', 'sl', 'su']
+        field = field_.encode('utf-8')
+
+        if field_ not in out_fields:
+            raise Exception('AcadosOcpSolverCython.get_all_stages(): {} is an invalid argument.\
+                    \n Possible values are {}.'.format(field_, out_fields))
+
+        cdef int n_stages = self.N if field_ in ('u', 'pi') else self.N + 1
+        dims = [acados_solver_common.ocp_nlp_dims_get_from_attr(self.nlp_config,
+            self.nlp_dims, self.nlp_out, stage, field) for stage in range(n_stages)]
+
+        cdef cnp.ndarray[cnp.float64_t, ndim=2] out = np.zeros((n_stages, max(dims)))
+        cdef int n_cols = out.shape[1]
+        cdef int i
+        for i in range(n_stages):
+            acados_solver_common.ocp_nlp_out_get(self.nlp_config, \
+                self.nlp_dims, self.nlp_out, i, field, <void *> (<double *> out.data + i * n_cols))
+
+        return out
+
+
     def print_statistics(self):
         """
         prints statistics of previous solver run as a table:
@@ -587,6 +618,65 @@ cdef class AcadosOcpSolverCython:
                     self.nlp_solver, stage, field, <void *> value.data)
         return
 
+    def set_all_stages(self, str field_, value_):
+        """
+        Set numerical data inside the solver at multiple shooting nodes at once,
+        row i of value is set at stage i, like set(i, field, value[i]).
+
+            :param field: string in ['x', 'u', 'pi', 'lam', 't', 'sl', 'su', 'p', 'yref', 'lbx', 'ubx', 'lbu', 'ubu']
+            :param value: 2D numpy array with one row per stage, starting at stage 0
+
+            .. note:: stages with a smaller dimension than the rows, e.g. yref at the terminal stage,
+                      are set from the leading entries of their row
+        """
+        if not isinstance(value_, np.ndarray) or value_.ndim != 2:
+            raise Exception(f"set_all_stages: value must be 2D numpy array, got {type(value_)}.")
+        cost_fields = ['y_ref', 'yref']
+        constraints_fields = ['lbx', 'ubx', 'lbu', 'ubu']
+        out_fields = ['x', 'u', 'pi', 'lam', 't', 'sl', 'su']
+
+        field = field_.encode('utf-8')
+
+        cdef cnp.ndarray[cnp.float64_t, ndim=2] value = np.ascontiguousarray(value_, dtype=np.float64)
+        cdef int n_stages = value.shape[0]
+        cdef int n_cols = value.shape[1]
+        cdef int stage
+
+        if n_stages > self.N + 1:
+            raise Exception(f'AcadosOcpSolverCython.set_all_stages(): got {n_stages} rows for {self.N + 1} stages.')
+
+        # treat parameters separately
+        if field_ == 'p':
+            for stage in range(n_stages):
+                assert acados_solver.acados_update_params(self.capsule, stage, <double *> value.data + stage * n_cols, n_cols) == 0
+            return
+
+        if field_ not in constraints_fields + cost_fields + out_fields:
+            raise Exception("AcadosOcpSolverCython.set_all_stages(): {} is not a valid argument.\
+                \nPossible values are {}.".format(field, \
+                constraints_fields + cost_fields + out_fields + ['p']))
+
+        # check all stages first, so a mismatch doesn't leave the solver partially updated
+        for stage in range(n_stages):
+            dims = acados_solver_common.ocp_nlp_dims_get_from_attr(self.nlp_config,
+                self.nlp_dims, self.nlp_out, stage, field)
+            if dims > n_cols:
+                msg = 'AcadosOcpSolverCython.set_all_stages(): mismatching dimension for field "{}" '.format(field_)
+                msg += 'with dimension {} at stage {} (you have {})'.format(dims, stage, n_cols)
+                raise Exception(msg)
+
+        for stage in range(n_stages):
+            if field_ in constraints_fields:
+                acados_solver_common.ocp_nlp_constraints_model_set(self.nlp_config,
+                    self.nlp_dims, self.nlp_in, stage, field, <void *> (<double *> value.data + stage * n_cols))
+            elif field_ in cost_fields:
+                acados_solver_common.ocp_nlp_cost_model_set(self.nlp_config,
+                    self.nlp_dims, self.nlp_in, stage, field, <void *> (<double *> value.data + stage * n_cols))
+            else:
+                acados_solver_common.ocp_nlp_out_set(self.nlp_config,
+                    self.nlp_dims, self.nlp_out, stage, field, <void *> (<double *> value.data + stage * n_cols))
+        return
+
     def cost_set(self, int stage, str field_, value_):
         """
         Set numerical data in the cost module of the solver.